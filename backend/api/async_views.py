@@ -0,0 +1,95 @@
+"""Асинхронные точки входа для чтения под ASGI.
+
+В Django 4.0 нет асинхронного ORM, а синхронные представления под ASGI
+выполняются в одном общем потоке (thread_sensitive), то есть процесс
+обслуживает такие запросы строго по одному. Здесь те же DRF-представления
+запускаются через sync_to_async(thread_sensitive=False) в отдельном пуле
+потоков: пока один запрос ждёт базу, цикл событий принимает следующие.
+Бизнес-логика, кэши и права остаются в синхронных представлениях.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+
+from .views import (IngredientViewSet, RecipeViewSet, SubscriptionList,
+                    TagViewSet)
+
+READ_METHODS = ('GET', 'HEAD')
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_READ_WORKERS,
+    thread_name_prefix='async-read'
+)
+
+
+def _run(view, request, args, kwargs):
+    # Соединения потоков пула живут дольше запроса: закрываем их по тем
+    # же правилам (CONN_MAX_AGE), что и сигналы начала/конца запроса.
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response = response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def offloaded(view):
+    """Асинхронная обёртка над синхронным представлением."""
+    run = sync_to_async(_run, thread_sensitive=False, executor=executor)
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        return await run(view, request, args, kwargs)
+
+    return async_view
+
+
+recipe_list = offloaded(RecipeViewSet.as_view({'get': 'list'}))
+recipe_detail = offloaded(RecipeViewSet.as_view({'get': 'retrieve'}))
+tag_list = offloaded(TagViewSet.as_view({'get': 'list'}))
+tag_detail = offloaded(TagViewSet.as_view({'get': 'retrieve'}))
+ingredient_list = offloaded(IngredientViewSet.as_view({'get': 'list'}))
+ingredient_detail = offloaded(
+    IngredientViewSet.as_view({'get': 'retrieve'})
+)
+subscription_list = offloaded(SubscriptionList.as_view())
+
+
+class AsyncReadMiddleware:
+    """Под ASGI направляет GET/HEAD в backend.async_urls.
+
+    Остальные запросы и запуск под WSGI идут через обычный ROOT_URLCONF.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    @staticmethod
+    def _route(request):
+        if (
+            settings.ASYNC_READ_VIEWS
+            and isinstance(request, ASGIRequest)
+            and request.method in READ_METHODS
+        ):
+            request.urlconf = settings.ASYNC_READ_URLCONF
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        self._route(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self._route(request)
+        return await self.get_response(request)
@@ -0,0 +1,199 @@
+import time
+from collections import OrderedDict
+from hashlib import md5
+from threading import Lock
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from foodgram import versions
+from replicas.router import primary
+
+
+class PayloadCache:
+    """Ограниченный LRU-кэш сериализованных ответов внутри процесса."""
+
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+payload_cache = PayloadCache()
+
+
+class VersionedCacheMixin:
+    """Кэширует list/retrieve справочника по версии данных.
+
+    Версия берётся из foodgram.versions, поэтому для ответа из кэша и
+    для 304 Not Modified база не нужна.
+    """
+    cache_version_name = None
+
+    def _cached_response(self, request, build):
+        version = versions.get_version(self.cache_version_name)
+        digest = md5(request.get_full_path().encode()).hexdigest()
+        etag = f'"{self.cache_version_name}-{version}-{digest[:16]}"'
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and etag in parse_etags(if_none_match):
+            return Response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers=headers)
+        key = (self.cache_version_name, version, digest)
+        data = payload_cache.get(key)
+        if data is None:
+            with primary():
+                response = build()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            payload_cache.set(key, data)
+        return Response(data, headers=headers)
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(
+            request, lambda: super(VersionedCacheMixin, self).list(
+                request, *args, **kwargs
+            )
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(
+            request, lambda: super(VersionedCacheMixin, self).retrieve(
+                request, *args, **kwargs
+            )
+        )
+
+
+def normalize_query(query_params):
+    """Строка запроса без пустых значений, с упорядоченными ключами.
+
+    ?tags=b&tags=a&page=1 и ?page=1&tags=a&tags=b&author= дают одну строку.
+    """
+    items = []
+    for key in sorted(query_params):
+        values = sorted(value for value in query_params.getlist(key) if value)
+        items.extend((key, value) for value in values)
+    return urlencode(items)
+
+
+class AnonymousResponseCacheMixin:
+    """Кэширует list/retrieve для анонимных GET-запросов в общем кэше.
+
+    Запись хранит версии данных, из которых она собрана (get_cache_versions),
+    и считается устаревшей, если хоть одна из них сменилась. Пересобирает
+    запись только тот процесс, который взял блокировку через cache.add;
+    остальные ждут её появления, а по таймауту блокировки строят ответ сами.
+    """
+    cache_key_prefix = None
+    lock_poll_interval = 0.05
+
+    def get_cache_versions(self, request, data=None):
+        """Имена версий, от которых зависит ответ.
+
+        Вызывается до построения ответа (data=None) и после — с его данными.
+        """
+        raise NotImplementedError
+
+    def get_cache_variant(self, request):
+        """Часть ключа для ответов, зависящих от заголовков запроса."""
+        return ''
+
+    def _cache_key(self, request):
+        digest = md5('|'.join((
+            request.get_host(),
+            request.path,
+            normalize_query(request.query_params),
+            self.get_cache_variant(request),
+        )).encode()).hexdigest()
+        return f'response:{self.cache_key_prefix}:{digest}'
+
+    @staticmethod
+    def _is_fresh(entry):
+        return entry is not None and versions.get_versions(
+            list(entry['versions'])
+        ) == entry['versions']
+
+    def _wait_for(self, key, lock_key):
+        deadline = time.monotonic() + (
+            settings.RECIPE_RESPONSE_CACHE_LOCK_TIMEOUT
+        )
+        while time.monotonic() < deadline:
+            time.sleep(self.lock_poll_interval)
+            entry = cache.get(key)
+            if self._is_fresh(entry):
+                return entry
+            if cache.get(lock_key) is None:
+                return None
+        return None
+
+    def _anonymous_cached(self, request, build):
+        if request.user.is_authenticated:
+            return build()
+        key = self._cache_key(request)
+        entry = cache.get(key)
+        if self._is_fresh(entry):
+            return Response(entry['data'])
+        lock_key = key + ':lock'
+        if not cache.add(
+            lock_key, 1, settings.RECIPE_RESPONSE_CACHE_LOCK_TIMEOUT
+        ):
+            entry = self._wait_for(key, lock_key)
+            if entry is not None:
+                return Response(entry['data'])
+            return build()
+        try:
+            # Версии читаются до сборки: запись, изменённая во время
+            # сборки, сделает результат устаревшим, а не вечным.
+            built_versions = versions.get_versions(
+                self.get_cache_versions(request)
+            )
+            with primary():
+                response = build()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            built_versions.update(versions.get_versions([
+                name for name in self.get_cache_versions(
+                    request, response.data
+                ) if name not in built_versions
+            ]))
+            cache.set(
+                key, {'versions': built_versions, 'data': response.data},
+                settings.RECIPE_RESPONSE_CACHE_TIMEOUT
+            )
+            return response
+        finally:
+            cache.delete(lock_key)
+
+    def list(self, request, *args, **kwargs):
+        return self._anonymous_cached(
+            request, lambda: super(AnonymousResponseCacheMixin, self).list(
+                request, *args, **kwargs
+            )
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._anonymous_cached(
+            request,
+            lambda: super(AnonymousResponseCacheMixin, self).retrieve(
+                request, *args, **kwargs
+            )
+        )
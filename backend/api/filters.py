@@ -1,19 +1,63 @@
 from django.db.models import Exists, OuterRef
 from rest_framework.filters import BaseFilterBackend, SearchFilter
 
-from foodgram.models import Favorite, Purchase
+from foodgram import fulltext, versions
+from foodgram.models import Favorite, Purchase, Recipe, Tag
+
+RecipeTag = Recipe.tags.through
+_tag_ids_by_slug = {}
+
+
+def get_tag_ids(slugs):
+    """Переводит слаги в id по карте, закэшированной до смены версии."""
+    version = versions.get_version('tags')
+    mapping = _tag_ids_by_slug.get(version)
+    if mapping is None:
+        mapping = dict(Tag.objects.values_list('slug', 'id'))
+        _tag_ids_by_slug.clear()
+        _tag_ids_by_slug[version] = mapping
+    return {mapping[slug] for slug in slugs if slug in mapping}
+
+
+def filter_by_tags(queryset, slugs, match_all=False):
+    """Фильтр по тегам через EXISTS по индексу (recipe_id, tag_id).
+
+    В отличие от JOIN не размножает строки, поэтому DISTINCT не нужен.
+    """
+    tag_ids = get_tag_ids(slugs)
+    if not tag_ids or match_all and len(tag_ids) < len(set(slugs)):
+        return queryset.none()
+    if not match_all:
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe=OuterRef('pk'),
+            tag__in=tag_ids
+        )))
+    for tag_id in tag_ids:
+        queryset = queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe=OuterRef('pk'),
+            tag=tag_id
+        )))
+    return queryset
 
 
 class RecipeFilter(BaseFilterBackend):
     def filter_queryset(self, request, queryset, view):
         tags = request.query_params.getlist('tags')
         if tags:
-            queryset = queryset.filter(tags__slug__in=tags).distinct()
+            queryset = filter_by_tags(
+                queryset,
+                tags,
+                match_all=request.query_params.get('tags_match') == 'all'
+            )
 
         author = request.query_params.get('author')
         if author:
             queryset = queryset.filter(author=author)
 
+        search = request.query_params.get('search')
+        if search:
+            queryset = fulltext.search(queryset, search)
+
         user = request.user
         if user.is_anonymous:
             return queryset
@@ -0,0 +1,129 @@
+"""Кэш карточек рецептов для ленты.
+
+Карточка RecipeListSerializer одинакова для всех читателей, кроме флагов
+is_favorited, is_in_shopping_cart и author.is_subscribed. Поэтому в общем
+кэше лежит карточка без флагов, по одной на рецепт, вместе с версиями
+данных, из которых она собрана: поколения рецепта и автора, теги и
+ингредиенты. Страница ленты — один get_many за карточками и версиями
+плюс множества членства текущего пользователя; теги и состав из базы
+догружаются только для рецептов без свежей карточки.
+"""
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Manager, Prefetch, prefetch_related_objects
+
+from foodgram import generations, images, ingredient_index, versions
+from foodgram.models import Recipe, RecipeIngredient
+from metrics.serializers import TimedListSerializer
+from replicas.router import primary
+
+from .membership import get_membership
+
+RECIPE_PREFETCH = (
+    'tags',
+    Prefetch(
+        'ing_in_recipe',
+        queryset=RecipeIngredient.objects.select_related('ingredient')
+    ),
+)
+SHARED_VERSIONS = ('tags', ingredient_index.VERSION_NAME)
+FLAGS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def version_names(recipe):
+    return [
+        generations.recipe(recipe.id),
+        generations.author(recipe.author_id),
+        *SHARED_VERSIONS,
+    ]
+
+
+class RecipeFragmentListSerializer(TimedListSerializer):
+    """Список RecipeListSerializer из закэшированных карточек."""
+
+    def _variant(self):
+        # В карточке абсолютные ссылки на изображение выбранной копии,
+        # а WebP — только для клиентов, которые его принимают.
+        request = self.context.get('request')
+        base = request.build_absolute_uri('/') if request else ''
+        webp = images.accepts_webp(
+            request.META.get('HTTP_ACCEPT') if request else None
+        )
+        renditions = self.context.get('image_renditions', ())
+        return md5(
+            f'{base}|{",".join(renditions)}|{webp}'.encode()
+        ).hexdigest()[:12]
+
+    def _load(self, recipes):
+        """Рецепты с тегами и составом для сборки карточек."""
+        if all(recipe._state.db == DEFAULT_DB_ALIAS for recipe in recipes):
+            prefetch_related_objects(recipes, *RECIPE_PREFETCH)
+            return recipes
+        # Реплика могла отстать от уже сдвинутой версии: карточки для
+        # кэша собираются по основной базе.
+        with primary():
+            fresh = Recipe.objects.select_related('author').prefetch_related(
+                *RECIPE_PREFETCH
+            ).in_bulk([recipe.id for recipe in recipes])
+        return [fresh[recipe.id] for recipe in recipes if recipe.id in fresh]
+
+    def _bodies(self, recipes):
+        variant = self._variant()
+        keys = {
+            recipe.id: f'recipe:fragment:{variant}:{recipe.id}'
+            for recipe in recipes
+        }
+        names = {name for recipe in recipes for name in version_names(recipe)}
+        entries, current = versions.get_many_with_versions(
+            keys.values(), names
+        )
+        bodies, expected, misses = {}, {}, []
+        for recipe in recipes:
+            expected[recipe.id] = {
+                name: current[name] for name in version_names(recipe)
+            }
+            entry = entries.get(keys[recipe.id])
+            if entry is not None and entry['versions'] == expected[recipe.id]:
+                bodies[recipe.id] = entry['data']
+            else:
+                misses.append(recipe)
+        if not misses:
+            return bodies
+        built = {}
+        for recipe in self._load(misses):
+            body = self.child.to_representation(recipe)
+            body.update(dict.fromkeys(FLAGS))
+            body['author']['is_subscribed'] = None
+            # Версии прочитаны до сборки: изменение во время сборки сделает
+            # карточку устаревшей, а не вечной.
+            built[keys[recipe.id]] = {
+                'versions': expected[recipe.id], 'data': body
+            }
+            bodies[recipe.id] = body
+        cache.set_many(built, settings.RECIPE_FRAGMENT_CACHE_TIMEOUT)
+        return bodies
+
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        bodies = self._bodies(recipes) if recipes else {}
+        membership = get_membership(self.context.get('request'))
+        result = []
+        for recipe in recipes:
+            body = bodies.get(recipe.id)
+            if body is None:
+                # Удалён в основной базе, пока реплика его ещё отдаёт.
+                continue
+            body = dict(body)
+            body['author'] = {
+                **body['author'],
+                'is_subscribed': membership.is_subscribed(recipe.author_id),
+            }
+            body['is_favorited'] = self.child.get_is_favorited(recipe)
+            body['is_in_shopping_cart'] = (
+                self.child.get_is_in_shopping_cart(recipe)
+            )
+            result.append(body)
+        return result
@@ -0,0 +1,81 @@
+"""Флаги «в избранном», «в корзине» и «подписан» для текущего пользователя.
+
+Вместо запроса .exists() на каждый объект множества id избранного,
+корзины и подписок загружаются один раз за запрос и только при первом
+обращении. Между запросами множества хранятся в общем кэше; их
+сбрасывают после коммита сигналы из api.signals — при любом изменении
+избранного, корзины и подписок, включая админку и каскадное удаление.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from foodgram.models import Favorite, Purchase, Subscription
+
+FAVORITES = 'favorites'
+CART = 'cart'
+SUBSCRIPTIONS = 'subscriptions'
+
+SOURCES = {
+    FAVORITES: (Favorite, 'recipe_id'),
+    CART: (Purchase, 'recipe_id'),
+    SUBSCRIPTIONS: (Subscription, 'subscribed_to_id'),
+}
+
+
+def _cache_key(user_id, kind):
+    return f'membership:{user_id}:{kind}'
+
+
+class Membership:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._sets = {}
+
+    def ids(self, kind):
+        if kind not in self._sets:
+            key = _cache_key(self.user_id, kind)
+            ids = cache.get(key)
+            if ids is None:
+                model, field = SOURCES[kind]
+                ids = frozenset(model.objects.filter(
+                    user=self.user_id
+                ).order_by().values_list(field, flat=True))
+                cache.set(key, ids, settings.MEMBERSHIP_CACHE_TIMEOUT)
+            self._sets[kind] = ids
+        return self._sets[kind]
+
+    def is_favorited(self, recipe_id):
+        return recipe_id in self.ids(FAVORITES)
+
+    def is_in_shopping_cart(self, recipe_id):
+        return recipe_id in self.ids(CART)
+
+    def is_subscribed(self, author_id):
+        return author_id in self.ids(SUBSCRIPTIONS)
+
+
+class AnonymousMembership:
+    def is_favorited(self, recipe_id):
+        return False
+
+    def is_in_shopping_cart(self, recipe_id):
+        return False
+
+    def is_subscribed(self, author_id):
+        return False
+
+
+def get_membership(request):
+    """Возвращает резолвер, общий для всех сериализаторов запроса."""
+    if request is None or request.user.is_anonymous:
+        return AnonymousMembership()
+    http_request = getattr(request, '_request', request)
+    membership = getattr(http_request, 'membership', None)
+    if membership is None or membership.user_id != request.user.id:
+        membership = Membership(request.user.id)
+        http_request.membership = membership
+    return membership
+
+
+def invalidate(user_id, *kinds):
+    cache.delete_many([_cache_key(user_id, kind) for kind in kinds])
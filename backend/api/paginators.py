@@ -1,4 +1,10 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, Cursor,
+                                       CursorPagination, PageNumberPagination)
+
+POSITION_SEPARATOR = '|'
 
 
 class RecipesCustomPagination(PageNumberPagination):
@@ -6,3 +12,144 @@ class RecipesCustomPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     max_page_size = 20
     page_query_param = 'page'
+
+
+class KeysetCursorPagination(CursorPagination):
+    """Курсор по всем полям ordering, а не только по первому.
+
+    CursorPagination в DRF ищет позицию по первому полю и добирает
+    остальное смещением, которое на одинаковых значениях (например, на
+    времени публикации после массовой загрузки) превращается в OFFSET.
+    Здесь позиция — значения всех полей ключа, а условие
+    (a, b) < (x, y) раскрыто в a <= x AND (a < x OR a = x AND b < y),
+    так что страница — один проход по составному индексу.
+    """
+    page_size = 3
+    page_size_query_param = 'limit'
+    max_page_size = 20
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.fields = [
+            queryset.model._meta.get_field(name.lstrip('-'))
+            for name in self.ordering
+        ]
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, position = False, None
+        else:
+            _, reverse, position = self.cursor
+        ordering = self.ordering
+        if reverse:
+            ordering = [
+                name[1:] if name.startswith('-') else f'-{name}'
+                for name in ordering
+            ]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.seek(position, reverse))
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        return self.page
+
+    def seek(self, position, reverse):
+        """Условие «строго после позиции» в порядке обхода."""
+        values = position.split(POSITION_SEPARATOR)
+        if len(values) != len(self.fields):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            values = [
+                field.to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+        equal = {}
+        condition = None
+        for name, field, value in zip(self.ordering, self.fields, values):
+            lookup = 'lt' if name.startswith('-') != reverse else 'gt'
+            term = Q(**equal, **{f'{field.name}__{lookup}': value})
+            condition = term if condition is None else condition | term
+            equal[field.name] = value
+        first, value = self.fields[0].name, values[0]
+        bound = 'lte' if self.ordering[0].startswith('-') != reverse else 'gte'
+        return Q(**{f'{first}__{bound}': value}) & condition
+
+    def position(self, instance):
+        return POSITION_SEPARATOR.join(
+            field.value_to_string(instance) for field in self.fields
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=self.position(
+                self.page[-1]
+            ))
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=self.position(
+                self.page[0]
+            ))
+        )
+
+
+class OptionalCursorPagination(BasePagination):
+    """Постраничная навигация с курсором по запросу клиента.
+
+    По умолчанию работают номера страниц. Курсор включается параметром
+    ?pagination=cursor, дальше клиент ходит по ссылкам next/previous,
+    в которых уже есть ?cursor=. Оба режима идут по одному ключу
+    ordering; номера страниц сохраняют только явную сортировку запроса
+    (например, по релевантности поиска).
+    """
+    page_number_class = RecipesCustomPagination
+    cursor_class = KeysetCursorPagination
+    mode_query_param = 'pagination'
+    ordering = ()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_mode = (
+            self.cursor_class.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+        if cursor_mode:
+            self.paginator = self.cursor_class()
+            self.paginator.ordering = self.ordering
+        else:
+            self.paginator = self.page_number_class()
+            if not queryset.query.order_by:
+                queryset = queryset.order_by(*self.ordering)
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number_class().get_paginated_response_schema(schema)
+
+
+class RecipesPagination(OptionalCursorPagination):
+    # Индекс recipe_pub_date_id_idx.
+    ordering = ('-pub_date', '-id')
+
+
+class SubscriptionsPagination(OptionalCursorPagination):
+    # Автор уникален в подписках пользователя: индекс ограничения
+    # (user, subscribed_to).
+    ordering = ('subscribed_to',)
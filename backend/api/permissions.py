@@ -11,6 +11,6 @@ class OwnerOrReadOnly(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
         return (
-            obj.author == request.user
+            obj.author_id == request.user.id
             or request.method in permissions.SAFE_METHODS
         )
@@ -1,28 +1,37 @@
+from django.conf import settings
+from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
+from rest_framework.validators import UniqueTogetherValidator
 
+from foodgram import images, shopping_cart
 from foodgram.models import (Favorite, Ingredient, Purchase, Recipe,
                              RecipeIngredient, Subscription, Tag)
+from metrics.serializers import TimedDataMixin, TimedListSerializer
 from users.serializers import CustomUserSerializer
 
+from .fragments import RecipeFragmentListSerializer
+from .membership import get_membership
 
-class TagSerializer(serializers.ModelSerializer):
+
+class TagSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ('id', 'name', 'color', 'slug')
+        list_serializer_class = TimedListSerializer
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit')
+        list_serializer_class = TimedListSerializer
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        source='ingredient',
-        queryset=Ingredient.objects.all()
-    )
+    # Существование ингредиентов проверяется одним in_bulk
+    # в RecipePostSerializer.validate_ingredients.
+    id = serializers.IntegerField(source='ingredient_id')
 
     class Meta:
         model = RecipeIngredient
@@ -42,7 +51,58 @@ class RecipeIngredientListSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
+class RecipeImageField(serializers.ImageField):
+    """Ссылка на первую готовую копию изображения из renditions.
+
+    Пока фоновая обработка не закончена, отдаётся исходный файл. WebP
+    отдаётся, только если клиент указал его в Accept, иначе — следующая
+    копия (JPEG). Представление может заменить порядок копий ключом
+    контекста image_renditions.
+    """
+
+    def __init__(self, renditions=(), **kwargs):
+        self.renditions = renditions
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        request = self.context.get('request')
+        renditions = images.accepted_renditions(
+            self.context.get('image_renditions', self.renditions),
+            request.META.get('HTTP_ACCEPT') if request else None
+        )
+        for name in renditions:
+            image = getattr(recipe, f'image_{name}')
+            if image:
+                return super().to_representation(image)
+        return super().to_representation(recipe.image)
+
+
+class RecipeFlagsMixin:
+    """is_favorited и is_in_shopping_cart без запроса на каждый рецепт.
+
+    Сначала берутся Exists-аннотации RecipeFilter, иначе — множества из
+    резолвера членства текущего запроса.
+    """
+
+    def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favor'):
+            return obj.is_favor
+        return get_membership(
+            self.context.get('request')
+        ).is_favorited(obj.id)
+
+    def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'in_cart'):
+            return obj.in_cart
+        return get_membership(
+            self.context.get('request')
+        ).is_in_shopping_cart(obj.id)
+
+
+class RecipeListSerializer(TimedDataMixin, RecipeFlagsMixin,
+                           serializers.ModelSerializer):
     author = CustomUserSerializer()
     ingredients = RecipeIngredientListSerializer(
         source='ing_in_recipe',
@@ -53,7 +113,7 @@ class RecipeListSerializer(serializers.ModelSerializer):
         many=True,
         read_only=True
     )
-    image = Base64ImageField(max_length=None)
+    image = RecipeImageField(renditions=('webp', 'thumbnail'))
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -64,27 +124,29 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'is_favorited', 'is_in_shopping_cart', 'name',
             'image', 'text', 'cooking_time'
         )
+        list_serializer_class = RecipeFragmentListSerializer
 
-    def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        return Favorite.objects.filter(
-            user=request.user,
-            recipe=obj
-        ).exists()
 
-    def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        return Purchase.objects.filter(
-            user=request.user,
-            recipe=obj
-        ).exists()
+class TagIdsField(serializers.ListField):
+    child = serializers.IntegerField()
+
+    def to_representation(self, tags):
+        return [tag.id for tag in tags.all()]
+
+
+def in_bulk_or_error(model, ids):
+    """Загружает объекты одним запросом, сообщая о несуществующих id."""
+    objects = model.objects.in_bulk(ids)
+    missing = [pk for pk in ids if pk not in objects]
+    if missing:
+        raise serializers.ValidationError(
+            f'Недопустимые первичные ключи {missing} - объекты не существуют.'
+        )
+    return objects
 
 
-class RecipePostSerializer(serializers.ModelSerializer):
+class RecipePostSerializer(TimedDataMixin, RecipeFlagsMixin,
+                           serializers.ModelSerializer):
     author = CustomUserSerializer(read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
@@ -93,10 +155,7 @@ class RecipePostSerializer(serializers.ModelSerializer):
         source='ing_in_recipe',
         many=True,
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
+    tags = TagIdsField()
     image = Base64ImageField(max_length=None, use_url=False,)
 
     class Meta:
@@ -106,78 +165,106 @@ class RecipePostSerializer(serializers.ModelSerializer):
             'image', 'name', 'text', 'cooking_time',
             'is_favorited', 'is_in_shopping_cart'
         )
+        list_serializer_class = TimedListSerializer
 
     def validate_tags(self, tags):
         if len(tags) > len(set(tags)):
             raise serializers.ValidationError(
                 'Повторяющихся тегов в одном рецепе быть не должно!'
             )
-        return tags
+        found = in_bulk_or_error(Tag, tags)
+        return [found[pk] for pk in tags]
 
     def validate_ingredients(self, ingredients):
         if not ingredients:
             raise serializers.ValidationError('Не выбраны ингредиенты!')
-        ingredient_list = []
-        for ingredient in ingredients:
-            ingredient_id = ingredient.get('ingredient')
-            if ingredient_id in ingredient_list:
-                raise serializers.ValidationError(
-                    'Ингредиенты не должны повторяться'
-                )
-            ingredient_list.append(ingredient_id)
-        return ingredients
-
-    def _add_ingredients(self, recipe, ingredients):
-        temp_list = []
-        for ingredient in ingredients:
-            ingredient_id = ingredient.get('ingredient')
-            amount = ingredient.get('amount')
-            temp_list.append(
-                RecipeIngredient(
-                    recipe=recipe,
-                    ingredient=ingredient_id,
-                    amount=amount
-                )
+        ingredient_ids = [
+            ingredient['ingredient_id'] for ingredient in ingredients
+        ]
+        if len(ingredient_ids) > len(set(ingredient_ids)):
+            raise serializers.ValidationError(
+                'Ингредиенты не должны повторяться'
             )
-        RecipeIngredient.objects.bulk_create(temp_list)
+        found = in_bulk_or_error(Ingredient, ingredient_ids)
+        return [
+            {
+                'ingredient': found[ingredient['ingredient_id']],
+                'amount': ingredient['amount'],
+            }
+            for ingredient in ingredients
+        ]
+
+    def _save_ingredients(self, recipe, ingredients, current=()):
+        """Применяет к составу рецепта только реальные изменения.
+
+        Возвращает прежние количества {ingredient_id: amount}.
+        """
+        current = {row.ingredient_id: row for row in current}
+        old_amounts = {
+            ingredient_id: row.amount for ingredient_id, row in current.items()
+        }
+        amounts = {
+            ingredient['ingredient'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        to_create = [
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        ]
+        to_update = []
+        for ingredient_id, row in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != row.amount:
+                row.amount = amount
+                to_update.append(row)
+        to_delete = [
+            row.id for ingredient_id, row in current.items()
+            if ingredient_id not in amounts
+        ]
+        if to_delete:
+            RecipeIngredient.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+        return old_amounts
 
     def create(self, validated_data):
         author = self.context['request'].user
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ing_in_recipe')
-        recipe = Recipe.objects.create(author=author, **validated_data)
-        recipe.tags.set(tags)
-        self._add_ingredients(recipe, ingredients)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(author=author, **validated_data)
+            recipe.tags.set(tags)
+            self._save_ingredients(recipe, ingredients)
+            images.schedule(recipe.id)
         return recipe
 
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ing_in_recipe')
-        instance.tags.set(tags)
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        self._add_ingredients(instance, ingredients)
-        return super().update(instance, validated_data)
-
-    def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        return Favorite.objects.filter(
-            user=request.user,
-            recipe=obj
-        ).exists()
-
-    def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        return Purchase.objects.filter(
-            user=request.user,
-            recipe=obj
-        ).exists()
+        with transaction.atomic():
+            if 'image' in validated_data:
+                images.reset_renditions(instance)
+                images.schedule(instance.id)
+            instance.tags.set(tags)
+            old_amounts = self._save_ingredients(
+                instance, ingredients, instance.ing_in_recipe.all()
+            )
+            shopping_cart.update_recipe(instance.id, old_amounts, {
+                ingredient['ingredient'].id: ingredient['amount']
+                for ingredient in ingredients
+            })
+            instance = super().update(instance, validated_data)
+        return instance
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
+class SubscriptionSerializer(TimedDataMixin, serializers.ModelSerializer):
     id = serializers.IntegerField(source='subscribed_to.id')
     email = serializers.EmailField(source='subscribed_to.email')
     first_name = serializers.CharField(source='subscribed_to.first_name')
@@ -191,26 +278,25 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             'id', 'email', 'first_name',
             'last_name', 'recipes', 'recipes_count'
         )
+        list_serializer_class = TimedListSerializer
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        if request.GET.get('recipes_limit'):
-            recipes_limit = int(request.GET.get('recipes_limit'))
-            queryset = Recipe.objects.filter(
-                author=obj.subscribed_to
-            ).order_by('-id')[:recipes_limit]
+        if hasattr(obj, 'latest_recipes'):
+            queryset = obj.latest_recipes
         else:
             queryset = Recipe.objects.filter(
                 author=obj.subscribed_to
-            ).order_by('-id')
+            ).order_by('-id')[:settings.SUBSCRIPTION_RECIPES_LIMIT]
         return MiniRecipesSerializer(queryset, many=True).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.subscribed_to).count()
+        return obj.subscribed_to.recipes_count
 
 
 class FavoritesSerializer(serializers.ModelSerializer):
-    user = serializers.PrimaryKeyRelatedField(read_only=True)
+    user = serializers.HiddenField(
+        default=serializers.CurrentUserDefault()
+    )
     recipe = serializers.PrimaryKeyRelatedField(
         queryset=Recipe.objects.all()
     )
@@ -218,10 +304,19 @@ class FavoritesSerializer(serializers.ModelSerializer):
     class Meta:
         model = Favorite
         fields = ('user', 'recipe')
+        validators = [
+            UniqueTogetherValidator(
+                queryset=Favorite.objects.all(),
+                fields=('user', 'recipe'),
+                message='Рецепт уже добавлен'
+            )
+        ]
 
 
 class PurchaseSerializer(serializers.ModelSerializer):
-    user = serializers.PrimaryKeyRelatedField(read_only=True)
+    user = serializers.HiddenField(
+        default=serializers.CurrentUserDefault()
+    )
     recipe = serializers.PrimaryKeyRelatedField(
         queryset=Recipe.objects.all()
     )
@@ -229,9 +324,29 @@ class PurchaseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Purchase
         fields = ('user', 'recipe')
+        validators = [
+            UniqueTogetherValidator(
+                queryset=Purchase.objects.all(),
+                fields=('user', 'recipe'),
+                message='Рецепт уже добавлен'
+            )
+        ]
 
 
 class MiniRecipesSerializer(serializers.ModelSerializer):
+    image = RecipeImageField(renditions=('webp', 'thumbnail'))
+
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'cooking_time', 'image')
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_MAX
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
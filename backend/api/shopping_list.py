@@ -0,0 +1,139 @@
+"""Потоковая выгрузка списка покупок в CSV, TXT и PDF.
+
+Формат выбирается обычным механизмом DRF: параметром ?format= или
+заголовком Accept, поэтому каждому формату соответствует свой рендерер.
+Сам список отдаётся потоком, а строки читаются из базы итератором (на
+PostgreSQL это серверный курсор), так что память не зависит от размера
+списка. Под ASGI куски собираются вне цикла событий, см.
+backend.streaming.
+"""
+import csv
+import tempfile
+from functools import lru_cache
+
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer
+
+from backend.streaming import OffloadedStreamingResponse
+
+CHUNK_SIZE = 8 * 1024
+ITERATOR_CHUNK_SIZE = 500
+
+
+class ShoppingListRenderer(BaseRenderer):
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Список отдаётся потоком, сюда попадают только ответы с ошибками.
+        if isinstance(data, dict):
+            data = data.get('detail', data)
+        return str(data).encode(self.charset)
+
+
+class CSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class TextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class PDFRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def _buffered(lines):
+    buffer = []
+    size = 0
+    for line in lines:
+        chunk = line.encode('utf-8')
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= CHUNK_SIZE:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def csv_chunks(rows):
+    yield u'\ufeff'.encode('utf-8')
+    writer = csv.writer(Echo())
+    yield from _buffered(writer.writerow(row) for row in rows)
+
+
+def text_chunks(rows):
+    yield from _buffered(
+        f'{name} ({measurement_unit}) — {amount}\n'
+        for name, measurement_unit, amount in rows
+    )
+
+
+@lru_cache(maxsize=None)
+def _register_pdf_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    pdfmetrics.registerFont(
+        TTFont('ShoppingList', settings.SHOPPING_LIST_PDF_FONT)
+    )
+    return 'ShoppingList'
+
+
+def pdf_chunks(rows):
+    # PDF нельзя дописывать построчно: таблица ссылок пишется в конце
+    # файла. Поэтому документ собирается во временный файл, который
+    # уходит на диск при росте, и отдаётся кусками.
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    font = _register_pdf_font()
+    width, height = A4
+    margin, line_height = 50, 18
+    with tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE * 64) as output:
+        document = canvas.Canvas(output, pagesize=A4)
+        document.setTitle('Список покупок')
+        document.setFont(font, 14)
+        document.drawString(margin, height - margin, 'Список покупок')
+        document.setFont(font, 11)
+        y = height - margin - 2 * line_height
+        for name, measurement_unit, amount in rows:
+            if y < margin:
+                document.showPage()
+                document.setFont(font, 11)
+                y = height - margin
+            document.drawString(margin, y, f'{name} ({measurement_unit})')
+            document.drawRightString(width - margin, y, str(amount))
+            y -= line_height
+        document.save()
+        output.seek(0)
+        yield from iter(lambda: output.read(CHUNK_SIZE), b'')
+
+
+EXPORTERS = {
+    CSVRenderer.format: csv_chunks,
+    TextRenderer.format: text_chunks,
+    PDFRenderer.format: pdf_chunks,
+}
+
+
+def shopping_list_response(queryset, renderer):
+    """Возвращает потоковый ответ; запрос выполнится при первой отдаче."""
+    rows = queryset.iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    response = OffloadedStreamingResponse(
+        EXPORTERS[renderer.format](rows),
+        content_type=renderer.media_type
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="shoppinglist.{renderer.format}"'
+    )
+    return response
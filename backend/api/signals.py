@@ -0,0 +1,30 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from foodgram import user_lists
+from foodgram.models import Favorite, Purchase, Subscription
+
+from . import membership
+
+KINDS = {model: kind for kind, (model, _) in membership.SOURCES.items()}
+
+
+def invalidate_on_commit(user_id, kind):
+    # До коммита параллельный запрос успел бы закэшировать старое множество.
+    transaction.on_commit(lambda: membership.invalidate(user_id, kind))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Purchase)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Purchase)
+@receiver(post_delete, sender=Subscription)
+def invalidate_membership(sender, instance, **kwargs):
+    invalidate_on_commit(instance.user_id, KINDS[sender])
+
+
+@receiver(user_lists.changed)
+def invalidate_changed_list(sender, user_id, **kwargs):
+    invalidate_on_commit(user_id, KINDS[sender])
@@ -0,0 +1,363 @@
+import asyncio
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.streaming import StreamingASGIHandler
+from foodgram import user_lists
+from foodgram.models import (Favorite, Ingredient, Purchase, Recipe,
+                             RecipeIngredient, ShoppingCartIngredient,
+                             Subscription, Tag)
+from users.models import User
+
+from . import membership, shopping_list
+
+
+class QueryBudgetTest(TestCase):
+    """Число запросов к базе не зависит от размера страницы.
+
+    Кэш очищается перед каждым тестом, поэтому меряется холодный запрос.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            'reader', 'reader@example.com', 'pass12345', 'Имя', 'Фамилия'
+        )
+        authors = [
+            User.objects.create_user(
+                f'author{number}', f'author{number}@example.com',
+                'pass12345', 'Имя', 'Фамилия'
+            )
+            for number in range(4)
+        ]
+        tags = [
+            Tag.objects.create(
+                name=f'тег {number}', color=f'#00000{number}',
+                slug=f'tag{number}'
+            )
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(4)
+        ]
+        for number in range(16):
+            recipe = Recipe.objects.create(
+                author=authors[number % 4], name=f'рецепт {number}',
+                text='текст', cooking_time=5, image='recipe_img/x.png'
+            )
+            recipe.tags.set(tags[:number % 3 + 1])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=number + 1
+                )
+                for ingredient in ingredients[:number % 4 + 1]
+            )
+            if number % 2:
+                Favorite.objects.create(user=cls.reader, recipe=recipe)
+            if number % 3 == 0:
+                Purchase.objects.create(user=cls.reader, recipe=recipe)
+        for author in authors:
+            Subscription.objects.create(user=cls.reader, subscribed_to=author)
+        cls.recipe = recipe
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def get(self, client, url, queries):
+        cache.clear()
+        with self.assertNumQueries(queries):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_recipe_list(self):
+        # количество, страница рецептов, теги, состав
+        for limit in (3, 12):
+            with self.subTest(limit=limit):
+                data = self.get(
+                    self.anonymous, f'/api/recipes/?limit={limit}', 4
+                )
+                self.assertEqual(len(data['results']), limit)
+
+    def test_recipe_list_authenticated(self):
+        # плюс подписки читателя; флаги избранного и корзины — в том же
+        # запросе, что и страница
+        for limit in (3, 12):
+            with self.subTest(limit=limit):
+                data = self.get(self.client, f'/api/recipes/?limit={limit}', 5)
+                self.assertEqual(len(data['results']), limit)
+                self.assertTrue(any(
+                    recipe['is_favorited'] for recipe in data['results']
+                ))
+
+    def test_recipe_detail(self):
+        # рецепт с флагами, теги, состав; читателю — ещё его подписки
+        url = f'/api/recipes/{self.recipe.id}/'
+        for client, queries in ((self.anonymous, 3), (self.client, 4)):
+            data = self.get(client, url, queries)
+            self.assertEqual(data['id'], self.recipe.id)
+
+    def test_subscriptions(self):
+        # количество, страница подписок с авторами, последние рецепты
+        for limit, recipes_limit in ((2, 1), (4, 3)):
+            with self.subTest(limit=limit, recipes_limit=recipes_limit):
+                data = self.get(
+                    self.client,
+                    f'/api/users/subscriptions/?limit={limit}'
+                    f'&recipes_limit={recipes_limit}',
+                    3
+                )
+                self.assertEqual(len(data['results']), limit)
+                for author in data['results']:
+                    self.assertEqual(len(author['recipes']), recipes_limit)
+
+    def walk(self, client, url, queries):
+        seen = []
+        while url:
+            data = self.get(client, url, queries)
+            seen.extend(data['results'])
+            url = data['next']
+        return seen
+
+    def test_recipe_cursor_pages(self):
+        # Одинаковое время публикации, как после массовой загрузки, и
+        # рецепты, опубликованные не в порядке id.
+        now = timezone.now()
+        Recipe.objects.update(pub_date=now)
+        Recipe.objects.filter(id__in=Recipe.objects.order_by('id').values(
+            'id'
+        )[:5]).update(pub_date=now + timezone.timedelta(days=1))
+        cursor = [
+            recipe['id'] for recipe in self.walk(
+                self.anonymous, '/api/recipes/?pagination=cursor&limit=5', 3
+            )
+        ]
+        pages = [
+            recipe['id'] for recipe in self.walk(
+                self.anonymous, '/api/recipes/?limit=5', 4
+            )
+        ]
+        self.assertEqual(cursor, pages)
+        self.assertEqual(cursor, list(
+            Recipe.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            )
+        ))
+        url = '/api/recipes/?pagination=cursor&limit=5'
+        second = self.get(
+            self.anonymous, self.get(self.anonymous, url, 3)['next'], 3
+        )
+        previous = self.get(self.anonymous, second['previous'], 3)
+        self.assertEqual(
+            [recipe['id'] for recipe in previous['results']], cursor[:5]
+        )
+
+    def test_subscription_modes_agree(self):
+        cursor, pages = (
+            [
+                author['id'] for author in self.walk(
+                    self.client, f'/api/users/subscriptions/?limit=3{mode}',
+                    queries
+                )
+            ]
+            for mode, queries in (('&pagination=cursor', 2), ('', 3))
+        )
+        self.assertEqual(cursor, pages)
+        self.assertEqual(cursor, sorted(cursor))
+
+
+class MembershipCacheTest(TestCase):
+    """Закэшированные множества сбрасываются при любом изменении."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            'reader', 'reader@example.com', 'pass12345', 'Имя', 'Фамилия'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='рецепт', text='текст', cooking_time=5,
+            image='recipe_img/x.png'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def ids(self, kind):
+        return membership.Membership(self.user.id).ids(kind)
+
+    def test_model_and_raw_changes(self):
+        self.assertEqual(self.ids(membership.FAVORITES), set())
+        self.assertEqual(self.ids(membership.CART), set())
+        with self.captureOnCommitCallbacks(execute=True):
+            # Как в админке: мимо эндпоинтов API.
+            Favorite.objects.create(user=self.user, recipe=self.recipe)
+        self.assertEqual(self.ids(membership.FAVORITES), {self.recipe.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            user_lists.add(Purchase, self.user.id, [self.recipe.id])
+        self.assertEqual(self.ids(membership.CART), {self.recipe.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+        self.assertEqual(self.ids(membership.FAVORITES), set())
+        self.assertEqual(self.ids(membership.CART), set())
+
+
+class RecipeImageFormatTest(TestCase):
+    """WebP отдаётся только клиентам, которые указали его в Accept."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            'author', 'author@example.com', 'pass12345', 'Имя', 'Фамилия'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=author, name='рецепт', text='текст', cooking_time=5,
+            image='recipe_img/x.png'
+        )
+        Recipe.objects.filter(pk=cls.recipe.pk).update(
+            image_thumbnail='recipe_img/renditions/x_thumbnail.jpg',
+            image_webp='recipe_img/renditions/x_webp.webp',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def image(self, accept):
+        response = APIClient().get('/api/recipes/', HTTP_ACCEPT=accept)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Accept', response['Vary'])
+        return response.json()['results'][0]['image']
+
+    def test_format_follows_accept(self):
+        # Один URL анонимной ленты: ответы и карточки в кэше раздельны.
+        for _ in range(2):
+            self.assertTrue(self.image(
+                'application/json, image/webp, */*'
+            ).endswith('.webp'))
+            self.assertTrue(self.image('application/json').endswith('.jpg'))
+
+
+class ShoppingCartDownloadASGITest(TransactionTestCase):
+    """Выгрузка списка покупок через ASGI-приложение, как под uvicorn.
+
+    Синхронное представление работает в отдельном потоке, поэтому данные
+    должны быть закоммичены, а не лежать в транзакции теста.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            'buyer', 'buyer@example.com', 'pass12345', 'Имя', 'Фамилия'
+        )
+        self.token = Token.objects.create(user=self.user)
+        ShoppingCartIngredient.objects.bulk_create(
+            ShoppingCartIngredient(
+                user=self.user,
+                ingredient=Ingredient.objects.create(
+                    name=name, measurement_unit='г'
+                ),
+                amount=amount
+            )
+            for name, amount in (('мука', 500), ('сахар', 150))
+        )
+
+    async def _download(self, file_format):
+        path = '/api/recipes/download_shopping_cart/'
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': f'format={file_format}'.encode(),
+            'root_path': '',
+            'headers': [
+                (b'host', b'localhost'),
+                (b'authorization', f'Token {self.token.key}'.encode()),
+            ],
+            'client': ('127.0.0.1', 50000),
+            'server': ('localhost', 80),
+        }
+        communicator = ApplicationCommunicator(
+            StreamingASGIHandler(), scope
+        )
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        start = await communicator.receive_output(timeout=10)
+        parts = []
+        while True:
+            message = await communicator.receive_output(timeout=10)
+            parts.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        await communicator.wait()
+        return start['status'], parts
+
+    def download(self, file_format):
+        status, parts = async_to_sync(self._download)(file_format)
+        return status, b''.join(parts)
+
+    def test_text_formats(self):
+        for file_format in ('csv', 'txt'):
+            with self.subTest(file_format=file_format):
+                status, body = self.download(file_format)
+                self.assertEqual(status, 200)
+                text = body.decode('utf-8-sig')
+                self.assertIn('мука', text)
+                self.assertIn('сахар', text)
+                self.assertLess(text.index('мука'), text.index('сахар'))
+
+    def test_streams_lazily_outside_event_loop(self):
+        ShoppingCartIngredient.objects.bulk_create(
+            ShoppingCartIngredient(
+                user=self.user,
+                ingredient=Ingredient.objects.create(
+                    name=f'ингредиент {number:03}', measurement_unit='г'
+                ),
+                amount=number + 1
+            )
+            for number in range(200)
+        )
+        consumed, at_chunk = [], []
+
+        def counted(rows):
+            for row in rows:
+                consumed.append(row)
+                yield row
+
+        def exporter(rows):
+            for chunk in shopping_list.csv_chunks(counted(rows)):
+                with self.assertRaises(RuntimeError):
+                    # Куски собираются не в потоке цикла событий.
+                    asyncio.get_running_loop()
+                at_chunk.append(len(consumed))
+                yield chunk
+
+        with mock.patch.object(shopping_list, 'CHUNK_SIZE', 256), \
+                mock.patch.object(shopping_list, 'ITERATOR_CHUNK_SIZE', 20), \
+                mock.patch.dict(shopping_list.EXPORTERS, {'csv': exporter}):
+            status, parts = async_to_sync(self._download)('csv')
+        self.assertEqual(status, 200)
+        self.assertGreater(len([part for part in parts if part]), 10)
+        # Первые куски ушли клиенту до чтения всех строк.
+        self.assertLess(at_chunk[2], len(consumed))
+        self.assertEqual(len(consumed), 202)
+        self.assertEqual(b''.join(parts).decode('utf-8-sig').count('\n'), 202)
+
+    def test_pdf(self):
+        status, body = self.download('pdf')
+        self.assertEqual(status, 200)
+        self.assertTrue(body.startswith(b'%PDF'))
+        self.assertIn(b'%%EOF', body[-32:])
@@ -1,9 +1,9 @@
-import csv
 from http import HTTPStatus
 
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, mixins, status, viewsets
 from rest_framework.decorators import action
@@ -11,34 +11,91 @@ from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
-from .filters import IngredientFilter, RecipeFilter
-from .paginators import RecipesCustomPagination
+from .caching import AnonymousResponseCacheMixin, VersionedCacheMixin
+from .filters import IngredientFilter, RecipeFilter, get_tag_ids
+from .fragments import RECIPE_PREFETCH
+from .paginators import RecipesPagination, SubscriptionsPagination
 from .permissions import OwnerOrReadOnly
 from .serilalizers import (FavoritesSerializer, IngredientSerializer,
-                           PurchaseSerializer, RecipeListSerializer,
-                           RecipePostSerializer, SubscriptionSerializer,
-                           TagSerializer)
+                           PurchaseSerializer, RecipeIdsSerializer,
+                           RecipeListSerializer, RecipePostSerializer,
+                           SubscriptionSerializer, TagSerializer)
+from .shopping_list import (CSVRenderer, PDFRenderer, TextRenderer,
+                            shopping_list_response)
 
+from foodgram import generations, images, ingredient_index, user_lists
 from foodgram.models import (Favorite, Ingredient, Purchase, Recipe,
-                             RecipeIngredient, Subscription, Tag)
+                             ShoppingCartIngredient, Subscription, Tag)
 from users.models import User
 
 
-class TagViewSet(mixins.ListModelMixin,
+class TagViewSet(VersionedCacheMixin,
+                 mixins.ListModelMixin,
                  mixins.RetrieveModelMixin,
                  viewsets.GenericViewSet):
     permission_classes = [AllowAny, ]
+    cache_version_name = 'tags'
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class ImageAcceptVaryMixin:
+    """Формат изображений в ответе выбирается по Accept (WebP или JPEG)."""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+
+class RecipeViewSet(ImageAcceptVaryMixin, AnonymousResponseCacheMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipePostSerializer
     permission_classes = [OwnerOrReadOnly, ]
     filter_backends = (DjangoFilterBackend, RecipeFilter)
     filterset_fileds = ('tags__slug',)
-    pagination_class = RecipesCustomPagination
+    pagination_class = RecipesPagination
+
+    def get_queryset(self):
+        queryset = Recipe.objects.select_related('author')
+        if self.action == 'list':
+            # Теги и состав догружаются только для рецептов без карточки
+            # в кэше, см. api.fragments.
+            return queryset
+        return queryset.prefetch_related(*RECIPE_PREFETCH)
+
+    cache_key_prefix = 'recipes'
+
+    def get_cache_versions(self, request, data=None):
+        names = ['tags', ingredient_index.VERSION_NAME]
+        if self.action == 'retrieve':
+            names.append(generations.recipe(self.kwargs['pk']))
+            if data is not None:
+                names.append(generations.author(data['author']['id']))
+            return names
+        author = request.query_params.get('author')
+        slugs = request.query_params.getlist('tags')
+        if author:
+            names.append(generations.author(author))
+        elif slugs and get_tag_ids(slugs):
+            names.extend(map(generations.tag, get_tag_ids(slugs)))
+        else:
+            names.append(generations.ALL)
+        return names
+
+    def get_cache_variant(self, request):
+        return 'webp' if images.accepts_webp(
+            request.META.get('HTTP_ACCEPT')
+        ) else ''
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'retrieve':
+            context['image_renditions'] = ('detail', )
+        return context
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
@@ -51,11 +108,27 @@ class RecipeViewSet(viewsets.ModelViewSet):
         data = {
             'recipe': recipe.id,
         }
-        serializer = input_serializer(data=data)
+        serializer = input_serializer(
+            data=data, context={'request': request}
+        )
         serializer.is_valid(raise_exception=True)
         serializer.save(user=user)
         return Response(HTTPStatus.CREATED)
 
+    def _bulk_favorite_or_purchase(self, request, model):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        change = (
+            user_lists.add if request.method == 'POST' else user_lists.remove
+        )
+        results = change(
+            model, request.user.id, serializer.validated_data['recipes']
+        )
+        return Response({'results': [
+            {'id': recipe_id, 'status': result}
+            for recipe_id, result in results.items()
+        ]})
+
     def _del_favorite_or_purchase(self, request, pk, model):
         user = request.user
         recipe = get_object_or_404(Recipe, id=pk)
@@ -64,7 +137,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post', ])
     def favorite(self, request, pk):
-        return self._add_favorite_or_purchase(request, pk, FavoritesSerializer)
+        return self._add_favorite_or_purchase(
+            request, pk, FavoritesSerializer
+        )
 
     @favorite.mapping.delete
     def delete_favorite(self, request, pk):
@@ -73,43 +148,95 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post', ])
     def shopping_cart(self, request, pk):
-        return self._add_favorite_or_purchase(request, pk, PurchaseSerializer)
+        return self._add_favorite_or_purchase(
+            request, pk, PurchaseSerializer
+        )
 
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, pk):
         self._del_favorite_or_purchase(request, pk, Purchase)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=False, methods=['get', ])
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated, ]
+    )
+    def bulk_favorite(self, request):
+        return self._bulk_favorite_or_purchase(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated, ]
+    )
+    def bulk_shopping_cart(self, request):
+        return self._bulk_favorite_or_purchase(request, Purchase)
+
+    @action(
+        detail=False,
+        methods=['get', ],
+        permission_classes=[IsAuthenticated, ],
+        renderer_classes=[CSVRenderer, TextRenderer, PDFRenderer]
+    )
     def download_shopping_cart(self, request):
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__purchase__user=request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(
-            ingredient_amount=Sum('amount')
-        ).values_list(
+        ingredients = ShoppingCartIngredient.objects.filter(
+            user=request.user
+        ).order_by('ingredient__name').values_list(
             'ingredient__name',
             'ingredient__measurement_unit',
-            'ingredient_amount'
+            'amount'
+        )
+        return shopping_list_response(
+            ingredients,
+            request.accepted_renderer
         )
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = ('attachment;'
-                                           'filename="shoppinglist.csv"')
-        response.write(u'\ufeff'.encode('utf8'))
-        writer = csv.writer(response)
-        for row in list(ingredients):
-            writer.writerow(row)
-        return response
 
 
-class SubscriptionList(generics.ListAPIView):
+def get_recipes_limit(request):
+    try:
+        recipes_limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return settings.SUBSCRIPTION_RECIPES_LIMIT
+    return max(0, min(recipes_limit, settings.SUBSCRIPTION_RECIPES_MAX_LIMIT))
+
+
+class SubscriptionList(ImageAcceptVaryMixin, generics.ListAPIView):
+    permission_classes = [IsAuthenticated, ]
     serializer_class = SubscriptionSerializer
-    pagination_class = RecipesCustomPagination
+    pagination_class = SubscriptionsPagination
 
     def get_queryset(self):
-        return Subscription.objects.filter(user=self.request.user)
+        return Subscription.objects.filter(
+            user=self.request.user
+        ).select_related('subscribed_to')
+
+    def _attach_latest_recipes(self, subscriptions):
+        recipes_limit = get_recipes_limit(self.request)
+        latest_recipes = {
+            subscription.subscribed_to_id: []
+            for subscription in subscriptions
+        }
+        if recipes_limit and latest_recipes:
+            top_ids = Recipe.objects.filter(
+                author=OuterRef('author')
+            ).order_by('-id').values('id')[:recipes_limit]
+            recipes = Recipe.objects.filter(
+                author__in=latest_recipes,
+                id__in=Subquery(top_ids)
+            ).order_by('author', '-id')
+            for recipe in recipes:
+                latest_recipes[recipe.author_id].append(recipe)
+        for subscription in subscriptions:
+            subscription.latest_recipes = latest_recipes[
+                subscription.subscribed_to_id
+            ]
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        self._attach_latest_recipes(page)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 
 class SubscribeViewSet(viewsets.ModelViewSet):
@@ -141,6 +268,7 @@ class SubscribeViewSet(viewsets.ModelViewSet):
 
 
 class IngredientViewSet(
+    VersionedCacheMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet
@@ -152,3 +280,12 @@ class IngredientViewSet(
     pagination_class = None
     search_fields = ['^name']
     ordering_fields = ('id',)
+    cache_version_name = ingredient_index.VERSION_NAME
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get(IngredientFilter.search_param)
+        if name:
+            return self._cached_response(
+                request, lambda: Response(ingredient_index.search(name))
+            )
+        return super().list(request, *args, **kwargs)
@@ -1,7 +1,13 @@
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+
+from .streaming import StreamingASGIHandler
+from .warmup import on_start
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+application = StreamingASGIHandler()
+
+on_start()
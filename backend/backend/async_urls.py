@@ -0,0 +1,20 @@
+"""Маршруты для ASGI: чтение через асинхронные обёртки, остальное — как в
+backend.urls. Подключается AsyncReadMiddleware только для GET/HEAD.
+"""
+from django.urls import path, re_path
+
+from api import async_views
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/recipes/', async_views.recipe_list),
+    re_path(r'^api/recipes/(?P<pk>\d+)/$', async_views.recipe_detail),
+    path('api/tags/', async_views.tag_list),
+    re_path(r'^api/tags/(?P<pk>\d+)/$', async_views.tag_detail),
+    path('api/ingredients/', async_views.ingredient_list),
+    re_path(r'^api/ingredients/(?P<pk>\d+)/$',
+            async_views.ingredient_detail),
+    path('api/users/subscriptions/', async_views.subscription_list),
+    *sync_urlpatterns,
+]
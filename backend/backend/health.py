@@ -0,0 +1,13 @@
+from django.http import JsonResponse
+
+from .warmup import warmup
+
+
+def ready(request):
+    """200 после прогрева процесса, иначе 503.
+
+    Если прогрев при старте не прошёл или был отключён, запускает его,
+    но не ждёт, когда он уже идёт в другом потоке.
+    """
+    is_ready = warmup.run(blocking=False)
+    return JsonResponse(warmup.status(), status=200 if is_ready else 503)
@@ -36,6 +36,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'metrics.middleware.MetricsMiddleware',
+    'api.async_views.AsyncReadMiddleware',
+    'replicas.middleware.StickyMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,20 +72,53 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+# Connection pool: stock engines are swapped for their dbpool wrappers,
+# connections are returned to the pool at the end of each request
+DB_POOL = env.bool('DB_POOL', default=True)
+POOLED_ENGINES = {
+    'django.db.backends.postgresql': 'dbpool.postgresql',
+    'django.db.backends.sqlite3': 'dbpool.sqlite3',
+}
+DB_ENGINE = os.getenv('DB_ENGINE', default='django.db.backends.postgresql')
+if DB_POOL:
+    DB_ENGINE = POOLED_ENGINES.get(DB_ENGINE, DB_ENGINE)
+
 # For prod mode
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv(
-            'DB_ENGINE', default='django.db.backends.postgresql'
-        ),
+        'ENGINE': DB_ENGINE,
         'NAME': os.getenv('DB_NAME', default='postgres'),
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
         'PORT': os.getenv('DB_PORT', default='5432'),
+        'POOL': {
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', default=20)),
+            'TIMEOUT': int(os.getenv('DB_POOL_TIMEOUT', default=10)),
+            'MAX_LIFETIME': 1800,
+            'CHECK_INTERVAL': 30,
+        },
     }
 }
 
+# Read replicas: PostgreSQL hosts (host or host:port) copying 'default',
+# reads go there; a client that wrote gets a signed REPLICA_STICKY_COOKIE
+# and keeps reading the primary for REPLICA_STICKY_TIMEOUT seconds
+DB_REPLICA_HOSTS = env.list('DB_REPLICA_HOSTS', default=[])
+DATABASE_REPLICAS = []
+for number, replica_host in enumerate(DB_REPLICA_HOSTS, start=1):
+    replica_host, _, replica_port = replica_host.partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'PORT': replica_port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+DATABASE_ROUTERS = ['replicas.router.PrimaryReplicaRouter']
+REPLICA_STICKY_TIMEOUT = int(os.getenv('REPLICA_STICKY_TIMEOUT', default=10))
+REPLICA_STICKY_COOKIE = 'replica_sticky'
+
 # For dev mode
 """ DATABASES = {
     'default': {
@@ -90,6 +126,21 @@ DATABASES = {
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     }
 } """
+# Versions of cached data and token lookups live here, so the cache must be
+# shared by all workers and management commands (Redis from
+# infra/docker-compose.yml). LocMemCache only suits a single process.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.redis.RedisCache'
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', default='redis://redis:6379/0'
+        ),
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -116,7 +167,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
 }
 
@@ -140,6 +191,60 @@ DJOSER = {
         'current_user': ['djoser.permissions.CurrentUserOrAdminOrReadOnly']
     }
 }
+# Subscriptions page: recipes shown per followed author
+SUBSCRIPTION_RECIPES_LIMIT = 3
+SUBSCRIPTION_RECIPES_MAX_LIMIT = 10
+
+# Shopping list PDF export: TTF font with Cyrillic glyphs
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# Background recipe image renditions: worker threads per process
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+
+# Favorite, cart and subscription id sets kept between requests, seconds
+MEMBERSHIP_CACHE_TIMEOUT = 300
+
+# Ingredient autocomplete: max results per query
+INGREDIENT_SEARCH_LIMIT = 20
+
+# Anonymous recipe list/detail responses: cache lifetime and rebuild lock
+RECIPE_RESPONSE_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_RESPONSE_CACHE_TIMEOUT', default=300)
+)
+RECIPE_RESPONSE_CACHE_LOCK_TIMEOUT = 10
+
+# Recipe cards without per-user flags, cached per recipe for the feed
+RECIPE_FRAGMENT_CACHE_TIMEOUT = 3600
+
+# Bulk favorite/shopping cart endpoints: max recipe ids per request
+BULK_RECIPES_MAX = 100
+
+# Token authentication: shared cache lifetime, per-process LRU size and
+# lifetime (also the shared lifetime when CACHES is a per-process LocMemCache,
+# i.e. how long other workers may still accept a revoked token)
+TOKEN_AUTH_CACHE_TIMEOUT = 300
+TOKEN_AUTH_LOCAL_CACHE_SIZE = 1024
+TOKEN_AUTH_LOCAL_CACHE_TIMEOUT = 10
+
+# Request metrics: Server-Timing for everyone (staff always get it),
+# shared directory for per-worker snapshots and /metrics bearer token
+METRICS_SERVER_TIMING = env.bool('METRICS_SERVER_TIMING', default=False)
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 1
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# ASGI: serve read endpoints from a thread pool instead of the single
+# thread Django uses for sync views; size of that pool per process
+ASYNC_READ_VIEWS = env.bool('ASYNC_READ_VIEWS', default=True)
+ASYNC_READ_URLCONF = 'backend.async_urls'
+ASYNC_READ_WORKERS = int(os.getenv('ASYNC_READ_WORKERS', default=16))
+
+# Warm up imports, URL resolvers and reference caches when wsgi/asgi loads
+WARMUP_ON_START = env.bool('WARMUP_ON_START', default=True)
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.0/topics/i18n/
 
@@ -0,0 +1,96 @@
+"""Потоковые ответы под ASGI без работы в цикле событий.
+
+ASGIHandler в Django 4.0 перебирает тело StreamingHttpResponse прямо в
+цикле событий: синхронный ORM там запрещён, а долгая сборка куска
+(например, PDF) останавливает все остальные запросы воркера. Куски
+OffloadedStreamingResponse под ASGI готовятся в отдельном потоке этого
+ответа и отправляются по мере готовности, поэтому тело по-прежнему не
+держится в памяти целиком. Под WSGI это обычный StreamingHttpResponse.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connections
+from django.http import StreamingHttpResponse
+
+
+def _close(source):
+    try:
+        close = getattr(source, 'close', None)
+        if close is not None:
+            close()
+    finally:
+        # Соединения этого потока больше никому не понадобятся.
+        connections.close_all()
+
+
+class OffloadedStreamingResponse(StreamingHttpResponse):
+    """Потоковый ответ, куски которого под ASGI собираются вне цикла."""
+
+    def __init__(self, streaming_content=(), *args, **kwargs):
+        # Генератор закрывается в том же потоке, где он работал.
+        self.source = streaming_content
+        super().__init__(streaming_content, *args, **kwargs)
+
+    async def offloaded_chunks(self):
+        # Один поток на ответ: генератор, курсор базы и соединение с ней
+        # должны оставаться в одном потоке.
+        executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='streaming-response'
+        )
+        loop = asyncio.get_running_loop()
+        iterator = iter(self)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(
+                    executor, next, iterator, None
+                )
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            await loop.run_in_executor(executor, _close, self.source)
+            executor.shutdown(wait=False)
+
+
+def response_headers(response):
+    headers = []
+    for header, value in response.items():
+        if isinstance(header, str):
+            header = header.encode('ascii')
+        if isinstance(value, str):
+            value = value.encode('latin1')
+        headers.append((bytes(header), bytes(value)))
+    for cookie in response.cookies.values():
+        headers.append(
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+        )
+    return headers
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """ASGIHandler, который отдаёт OffloadedStreamingResponse из потока."""
+
+    async def send_response(self, response, send):
+        if not isinstance(response, OffloadedStreamingResponse):
+            return await super().send_response(response, send)
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers(response),
+        })
+        chunks = response.offloaded_chunks()
+        try:
+            async for part in chunks:
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+        finally:
+            await chunks.aclose()
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
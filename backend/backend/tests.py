@@ -0,0 +1,37 @@
+from django.test import SimpleTestCase, override_settings
+
+from api.shopping_list import _register_pdf_font
+
+from .warmup import Warmup, register_pdf_font
+
+
+class WarmupTest(SimpleTestCase):
+
+    def setUp(self):
+        _register_pdf_font.cache_clear()
+        self.addCleanup(_register_pdf_font.cache_clear)
+
+    def steps(self, fail):
+        def database():
+            if fail:
+                raise ConnectionError('база недоступна')
+
+        return (('pdf_font', register_pdf_font), ('database', database))
+
+    @override_settings(SHOPPING_LIST_PDF_FONT='/nonexistent/DejaVuSans.ttf')
+    def test_missing_pdf_font_does_not_block_ready(self):
+        warmup = Warmup(self.steps(fail=False))
+        with self.assertLogs('backend.warmup', 'WARNING'):
+            self.assertTrue(warmup.run())
+        self.assertEqual(warmup.status()['skipped'], ['pdf_font'])
+        self.assertEqual(warmup.status()['failed'], [])
+
+    @override_settings(SHOPPING_LIST_PDF_FONT='/nonexistent/DejaVuSans.ttf')
+    def test_required_step_is_retried(self):
+        warmup = Warmup(self.steps(fail=True))
+        with self.assertLogs('backend.warmup', 'WARNING'):
+            self.assertFalse(warmup.run())
+        self.assertEqual(warmup.status()['failed'], ['database'])
+        warmup.steps = self.steps(fail=False)
+        self.assertTrue(warmup.run())
+        self.assertEqual(warmup.status()['skipped'], ['pdf_font'])
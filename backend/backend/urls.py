@@ -1,7 +1,13 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from metrics.views import metrics
+
+from .health import ready
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('metrics', metrics, name='metrics'),
+    path('health/ready', ready, name='health-ready'),
 ]
@@ -0,0 +1,185 @@
+"""Прогрев процесса до приёма запросов.
+
+Вызывается из wsgi.py/asgi.py после настройки Django: при gunicorn
+--preload один раз в мастере до fork, иначе в каждом воркере. Импортирует
+ленивые модули, строит URL-резолверы и поля сериализаторов, загружает
+переводы и заполняет кэши справочников. Время каждого шага сохраняется
+и отдаётся /health/ready, который отвечает 200 только после прогрева.
+Необязательные шаги (OPTIONAL_STEPS) готовят то, без чего сервис
+работает: их ошибка пишется в лог предупреждением и не держит прогрев.
+"""
+import logging
+import threading
+from importlib import import_module
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+LAZY_MODULES = (
+    'PIL.Image',
+    'reportlab.lib.pagesizes',
+    'reportlab.pdfgen.canvas',
+)
+SERIALIZER_MODULES = ('api.serilalizers', 'users.serializers')
+REFERENCE_PATHS = ('/api/tags/', '/api/ingredients/')
+
+
+def import_modules():
+    from django.contrib.auth.hashers import get_hashers
+    from django.utils import translation
+    from PIL import Image
+
+    for name in LAZY_MODULES:
+        import_module(name)
+    Image.init()
+    get_hashers()
+    with translation.override(settings.LANGUAGE_CODE):
+        translation.gettext('This field is required.')
+
+
+def register_pdf_font():
+    # Без шрифта из SHOPPING_LIST_PDF_FONT не будет только выгрузки в PDF.
+    from api.shopping_list import _register_pdf_font
+
+    _register_pdf_font()
+
+
+def populate_urls():
+    from django.urls import get_resolver
+
+    for urlconf in (settings.ROOT_URLCONF, settings.ASYNC_READ_URLCONF):
+        get_resolver(urlconf).reverse_dict
+
+
+def build_serializers():
+    from rest_framework.serializers import BaseSerializer, ListSerializer
+
+    for module_name in SERIALIZER_MODULES:
+        module = import_module(module_name)
+        for value in vars(module).values():
+            if (
+                isinstance(value, type)
+                and issubclass(value, BaseSerializer)
+                and not issubclass(value, ListSerializer)
+                and value.__module__ == module_name
+            ):
+                value().fields
+
+
+def prime_ingredient_index():
+    from foodgram import ingredient_index
+
+    ingredient_index.index.refresh()
+
+
+def prime_reference_data():
+    from django.test import RequestFactory
+    from django.urls import resolve
+
+    factory = RequestFactory(HTTP_HOST='localhost')
+    for path in REFERENCE_PATHS:
+        match = resolve(path)
+        response = match.func(factory.get(path), *match.args, **match.kwargs)
+        if response.status_code != 200:
+            raise RuntimeError(f'{path} вернул {response.status_code}')
+
+
+STEPS = (
+    ('imports', import_modules),
+    ('pdf_font', register_pdf_font),
+    ('urls', populate_urls),
+    ('serializers', build_serializers),
+    ('ingredient_index', prime_ingredient_index),
+    ('reference_data', prime_reference_data),
+)
+OPTIONAL_STEPS = ('pdf_font',)
+
+
+class Warmup:
+    def __init__(self, steps=STEPS, optional=OPTIONAL_STEPS):
+        self.steps = steps
+        self.optional = optional
+        self.ready = False
+        self.timings = {}
+        self.done = set()
+        self.failed = []
+        self.skipped = []
+        self.total = None
+        self._lock = threading.Lock()
+
+    def run(self, blocking=True):
+        """Выполняет шаги, если прогрев ещё не прошёл.
+
+        Упавший шаг не мешает остальным и повторяется при следующем
+        вызове: так /health/ready дождётся базы, недоступной при старте.
+        """
+        if self.ready or not self._lock.acquire(blocking=blocking):
+            return self.ready
+        try:
+            if not self.ready:
+                self._run_steps()
+        finally:
+            self._lock.release()
+        return self.ready
+
+    def _run_steps(self):
+        start = perf_counter()
+        failed = []
+        try:
+            for name, step in self.steps:
+                if name in self.done:
+                    continue
+                step_start = perf_counter()
+                try:
+                    step()
+                except Exception:
+                    if name in self.optional:
+                        logger.warning(
+                            'Optional warmup step %s skipped', name,
+                            exc_info=True
+                        )
+                        self.skipped.append(name)
+                        self.done.add(name)
+                    else:
+                        logger.exception('Warmup step %s failed', name)
+                        failed.append(name)
+                else:
+                    self.done.add(name)
+                self.timings[name] = (perf_counter() - step_start) * 1000
+        finally:
+            # Соединения мастера не должны достаться воркерам после fork.
+            connections.close_all()
+        self.total = (self.total or 0) + (perf_counter() - start) * 1000
+        self.failed = failed
+        self.ready = not failed
+        logger.info(
+            'Warmup %s in %.1f ms: %s',
+            'finished' if self.ready else 'failed', self.total,
+            ', '.join(f'{name}={ms:.1f}' for name, ms in self.timings.items())
+        )
+
+    def status(self):
+        return {
+            'ready': self.ready,
+            'total_ms': None if self.total is None else round(self.total, 1),
+            'steps_ms': {
+                name: round(ms, 1) for name, ms in self.timings.items()
+            },
+            'failed': self.failed,
+            'skipped': self.skipped,
+        }
+
+
+warmup = Warmup()
+
+
+def on_start():
+    # Отдельный поток: uvicorn без gunicorn импортирует приложение уже
+    # внутри цикла событий, где синхронный ORM запрещён.
+    if settings.WARMUP_ON_START:
+        thread = threading.Thread(target=warmup.run, name='warmup')
+        thread.start()
+        thread.join()
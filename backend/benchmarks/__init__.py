@@ -0,0 +1,12 @@
+"""Нагрузочные замеры API.
+
+Генерация данных по образцу datadump.json и прогон сценариев:
+
+    python -m benchmarks generate --recipes 100000 --favorites 1000000
+    python -m benchmarks run --iterations 50 --baseline bench.json
+    python -m benchmarks run --save-baseline bench.json
+    python -m benchmarks concurrency --concurrency 32 --db-latency 2
+
+База берётся из обычных настроек (DB_ENGINE, DB_NAME, ...), поэтому для
+замеров на SQLite достаточно DB_ENGINE=django.db.backends.sqlite3.
+"""
@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import sys
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser(
+        'generate', help='Fill the database with synthetic data'
+    )
+    from .datagen import DEFAULT_SIZES
+    for name, default in DEFAULT_SIZES.items():
+        generate.add_argument(f'--{name}', type=int, default=default)
+    generate.add_argument('--seed', type=int, default=1)
+    generate.add_argument('--batch-size', type=int, default=5000)
+
+    run = commands.add_parser('run', help='Run endpoint benchmarks')
+    run.add_argument('--iterations', type=int, default=30)
+    run.add_argument('--warmup', type=int, default=3)
+    run.add_argument('--cold-cache', action='store_true',
+                     help='Clear the cache before every measured request')
+    run.add_argument('--only', action='append', default=[],
+                     help='Run scenarios whose name starts with this prefix')
+    run.add_argument('--output', help='Write the report to this JSON file')
+    run.add_argument('--save-baseline', metavar='PATH',
+                     help='Store the report as the new baseline')
+    run.add_argument('--baseline', metavar='PATH',
+                     help='Compare with a stored baseline report')
+    run.add_argument('--tolerance', type=float, default=0.2)
+    run.add_argument('--metric', default='p95')
+
+    concurrency = commands.add_parser(
+        'concurrency',
+        help='Compare sync and async read views under ASGI in one process'
+    )
+    concurrency.add_argument('--requests', type=int, default=200)
+    concurrency.add_argument('--concurrency', type=int, default=16)
+    concurrency.add_argument('--db-latency', type=float, default=0.0,
+                             help='Extra milliseconds added to each query')
+    return parser.parse_args(argv)
+
+
+def generate(args):
+    from .datagen import DEFAULT_SIZES, Generator
+    sizes = {name: getattr(args, name) for name in DEFAULT_SIZES}
+    Generator(sizes, seed=args.seed, batch_size=args.batch_size,
+              stdout=sys.stdout).run()
+    return 0
+
+
+def run(args):
+    from .runner import Runner, compare
+    from .scenarios import all_scenarios
+    scenarios = [
+        scenario for scenario in all_scenarios()
+        if not args.only or scenario.name.startswith(tuple(args.only))
+    ]
+    report = Runner(
+        iterations=args.iterations, warmup=args.warmup,
+        cold_cache=args.cold_cache, stdout=sys.stdout
+    ).run(scenarios)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    failed = False
+    print(f'\n{"scenario":<32} {args.metric:>10} {"baseline":>10} change')
+    for name, value, base, change, regression in compare(
+        report, baseline, args.tolerance, args.metric
+    ):
+        if base is None:
+            print(f'{name:<32} {value:>10.2f} {"-":>10} new')
+            continue
+        mark = '  REGRESSION' if regression else ''
+        print(f'{name:<32} {value:>10.2f} {base:>10.2f} {change:+.0%}{mark}')
+        failed = failed or regression
+    return 1 if failed else 0
+
+
+def concurrency(args):
+    from .concurrency import run
+    run(requests=args.requests, concurrency=args.concurrency,
+        db_latency=args.db_latency, stdout=sys.stdout)
+    return 0
+
+
+def main(argv=None):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+    args = parse_args(argv)
+    return {
+        'generate': generate, 'run': run, 'concurrency': concurrency
+    }[args.command](args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
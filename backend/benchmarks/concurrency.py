@@ -0,0 +1,107 @@
+"""Пропускная способность одного процесса под ASGI.
+
+Одни и те же запросы чтения выполняются с заданным параллелизмом дважды:
+через синхронные представления (ASYNC_READ_VIEWS=False, Django выполняет
+их в одном потоке) и через асинхронные обёртки из api.async_views.
+--db-latency добавляет задержку к каждому SQL-запросу, имитируя сетевую
+задержку до PostgreSQL при замере на локальной SQLite.
+"""
+import asyncio
+import time
+from time import perf_counter
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, override_settings
+
+from .runner import percentile
+from .scenarios import Context
+
+
+def paths(context):
+    return [
+        '/api/recipes/',
+        f'/api/recipes/{context.recipe_id(0)}/',
+        '/api/tags/',
+        '/api/ingredients/?name=мук',
+        '/api/users/subscriptions/',
+    ]
+
+
+class LatencyInjector:
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.seconds)
+        return execute(sql, params, many, context)
+
+    def install(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        connection_created.connect(self.install)
+        for connection in connections.all():
+            self.install(connection)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.install)
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+async def measure(urls, requests, concurrency, headers):
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def fetch(number):
+        url = urls[number % len(urls)]
+        async with semaphore:
+            start = perf_counter()
+            response = await client.get(url, **headers)
+            latencies.append((perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise AssertionError(f'{url} вернул {response.status_code}')
+
+    start = perf_counter()
+    await asyncio.gather(*(fetch(number) for number in range(requests)))
+    elapsed = perf_counter() - start
+    return {
+        'requests_per_second': round(requests / elapsed, 1),
+        'p50': round(percentile(latencies, 50), 2),
+        'p95': round(percentile(latencies, 95), 2),
+    }
+
+
+def run(requests=200, concurrency=16, db_latency=0.0, stdout=None):
+    context = Context()
+    # AsyncRequestFactory в Django 4.0 передаёт extra как ASGI-заголовки,
+    # а Host всегда 'testserver'
+    headers = {'authorization': f'Token {context.token}'}
+    urls = paths(context)
+    results = {}
+    hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+    with LatencyInjector(db_latency / 1000):
+        for mode, enabled in (('sync', False), ('async', True)):
+            with override_settings(
+                ASYNC_READ_VIEWS=enabled, ALLOWED_HOSTS=hosts
+            ):
+                async_to_sync(measure)(urls, 10, concurrency, headers)
+                results[mode] = async_to_sync(measure)(
+                    urls, requests, concurrency, headers
+                )
+            if stdout is not None:
+                result = results[mode]
+                stdout.write(
+                    f'{mode:<6} {result["requests_per_second"]:>8.1f} req/s'
+                    f'  p50 {result["p50"]:>8.2f} ms'
+                    f'  p95 {result["p95"]:>8.2f} ms\n'
+                )
+    return results
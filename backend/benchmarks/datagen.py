@@ -0,0 +1,253 @@
+"""Синтетические данные, масштабированные из datadump.json.
+
+Реальные справочники (ингредиенты, теги) и образцы рецептов берутся из
+дампа и размножаются до нужных объёмов. Все объекты пишутся bulk_create
+пачками, поэтому сигналы не срабатывают: производные данные (счётчики,
+итоги корзин, поисковый индекс, версии кэшей) пересчитываются в конце.
+"""
+import io
+import json
+import os
+import random
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from foodgram import generations, ingredient_index, versions
+from foodgram.models import (Favorite, Ingredient, Purchase, Recipe,
+                             RecipeIngredient, Subscription, Tag)
+
+User = get_user_model()
+
+DUMP_PATH = os.path.join(settings.BASE_DIR, 'datadump.json')
+DUMP_ENCODING = 'cp1251'
+EMAIL_TEMPLATE = 'bench{}@example.com'
+PASSWORD = 'bench-password'
+IMAGE_NAME = 'recipe_img/bench.png'
+WORDS = (
+    'суп', 'салат', 'пирог', 'каша', 'запеканка', 'рагу', 'омлет', 'блины',
+    'котлеты', 'паста', 'плов', 'борщ', 'оладьи', 'сырники', 'жаркое',
+    'домашний', 'быстрый', 'острый', 'сливочный', 'овощной', 'грибной',
+    'куриный', 'рыбный', 'летний', 'праздничный', 'постный', 'сытный',
+)
+
+DEFAULT_SIZES = {
+    'ingredients': 10000,
+    'tags': 10,
+    'users': 10000,
+    'recipes': 100000,
+    'favorites': 1000000,
+    'carts': 100000,
+    'subscriptions': 50000,
+}
+
+
+def read_dump(path=DUMP_PATH):
+    with open(path, 'rb') as file:
+        records = json.loads(file.read().decode(DUMP_ENCODING))
+    dump = {}
+    for record in records:
+        dump.setdefault(record['model'], []).append(record['fields'])
+    return dump
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Generator:
+
+    def __init__(self, sizes, seed=1, batch_size=5000, stdout=None):
+        self.sizes = {**DEFAULT_SIZES, **sizes}
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.stdout = stdout
+        self.dump = read_dump()
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message + '\n')
+
+    def _create(self, model, objects, **kwargs):
+        created = 0
+        for batch in batched(objects, self.batch_size):
+            model.objects.bulk_create(batch, **kwargs)
+            created += len(batch)
+        return created
+
+    def _pairs(self, total, left_ids, right_ids, exclude_equal=False):
+        seen = set()
+        limit = len(left_ids) * len(right_ids)
+        total = min(total, limit - (len(left_ids) if exclude_equal else 0))
+        while len(seen) < total:
+            pair = (self.random.choice(left_ids),
+                    self.random.choice(right_ids))
+            if exclude_equal and pair[0] == pair[1]:
+                continue
+            if pair not in seen:
+                seen.add(pair)
+                yield pair
+
+    def ingredients(self):
+        catalog = [
+            (item['name'], item['measurement_unit'])
+            for item in self.dump['foodgram.ingredient']
+        ]
+        existing = set(Ingredient.objects.values_list(
+            'name', 'measurement_unit'
+        ))
+        wanted = self.sizes['ingredients']
+        rows = []
+        for number in range(wanted):
+            name, unit = catalog[number % len(catalog)]
+            if number >= len(catalog):
+                name = f'{name} {number // len(catalog) + 1}'
+            if (name, unit) not in existing:
+                rows.append(Ingredient(name=name, measurement_unit=unit))
+        self.log(f'ingredients: {self._create(Ingredient, rows)}')
+
+    def tags(self):
+        existing = set(Tag.objects.values_list('slug', flat=True))
+        rows = [
+            Tag(name=item['name'], color=item['color'], slug=item['slug'])
+            for item in self.dump['foodgram.tag']
+            if item['slug'] not in existing
+        ]
+        for number in range(len(self.dump['foodgram.tag']),
+                            self.sizes['tags']):
+            slug = f'bench-{number}'
+            if slug not in existing:
+                rows.append(Tag(
+                    name=f'Тег {number}', slug=slug,
+                    color='#{:06X}'.format(number * 2654435761 % 0xFFFFFF)
+                ))
+        self.log(f'tags: {self._create(Tag, rows, ignore_conflicts=True)}')
+
+    def users(self):
+        password = make_password(PASSWORD)
+        sample = self.dump['users.user']
+        rows = (
+            User(
+                email=EMAIL_TEMPLATE.format(number),
+                username=f'bench{number}',
+                first_name=sample[number % len(sample)]['first_name'],
+                last_name=sample[number % len(sample)]['last_name'],
+                password=password,
+            )
+            for number in range(self.sizes['users'])
+        )
+        created = self._create(User, rows, ignore_conflicts=True)
+        self.log(f'users: {created}')
+
+    def user_ids(self):
+        return list(User.objects.filter(
+            email__startswith='bench', email__endswith='@example.com'
+        ).values_list('id', flat=True))
+
+    def image(self):
+        if not default_storage.exists(IMAGE_NAME):
+            buffer = io.BytesIO()
+            Image.new('RGB', (640, 480), (200, 120, 60)).save(buffer, 'PNG')
+            default_storage.save(IMAGE_NAME, buffer)
+        return IMAGE_NAME
+
+    def recipe_name(self, number):
+        words = self.random.sample(WORDS, 3)
+        return f'{" ".join(words).capitalize()} №{number}'
+
+    def recipes(self, user_ids):
+        image = self.image()
+        texts = [item['text'] for item in self.dump['foodgram.recipe']]
+        start = Recipe.objects.count()
+        rows = (
+            Recipe(
+                author_id=self.random.choice(user_ids),
+                name=self.recipe_name(start + number),
+                text=' '.join(self.random.sample(WORDS, 8) + [
+                    self.random.choice(texts)
+                ]),
+                cooking_time=self.random.randint(5, 180),
+                image=image,
+            )
+            for number in range(self.sizes['recipes'])
+        )
+        self.log(f'recipes: {self._create(Recipe, rows)}')
+        recipe_ids = list(Recipe.objects.filter(
+            author__in=user_ids
+        ).values_list('id', flat=True))
+        new_ids = set(recipe_ids) - set(RecipeIngredient.objects.filter(
+            recipe__in=recipe_ids
+        ).values_list('recipe', flat=True))
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        RecipeTag = Recipe.tags.through
+        self._create(RecipeTag, (
+            RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in sorted(new_ids)
+            for tag_id in self.random.sample(
+                tag_ids, self.random.randint(1, min(3, len(tag_ids)))
+            )
+        ))
+        self._create(RecipeIngredient, (
+            RecipeIngredient(
+                recipe_id=recipe_id, ingredient_id=ingredient_id,
+                amount=self.random.randint(1, 500)
+            )
+            for recipe_id in sorted(new_ids)
+            for ingredient_id in self.random.sample(
+                ingredient_ids, self.random.randint(3, 10)
+            )
+        ))
+        return recipe_ids
+
+    def relations(self, user_ids, recipe_ids):
+        for model, size in ((Favorite, 'favorites'), (Purchase, 'carts')):
+            created = self._create(model, (
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id, recipe_id in self._pairs(
+                    self.sizes[size], user_ids, recipe_ids
+                )
+            ), ignore_conflicts=True)
+            self.log(f'{size}: {created}')
+        created = self._create(Subscription, (
+            Subscription(user_id=user_id, subscribed_to_id=author_id)
+            for user_id, author_id in self._pairs(
+                self.sizes['subscriptions'], user_ids, user_ids,
+                exclude_equal=True
+            )
+        ), ignore_conflicts=True)
+        self.log(f'subscriptions: {created}')
+
+    def derived(self, user_ids):
+        self.log('rebuilding derived data')
+        call_command('repair_counters', batch_size=self.batch_size,
+                     stdout=io.StringIO())
+        call_command('rebuild_shopping_cart', stdout=io.StringIO())
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self._create(Token, (
+            Token(user_id=user_id, key=Token.generate_key())
+            for user_id in user_ids[:100]
+        ), ignore_conflicts=True)
+        ingredient_index.invalidate()
+        versions.bump_version('tags')
+        generations.invalidate()
+
+    def run(self):
+        self.ingredients()
+        self.tags()
+        self.users()
+        user_ids = self.user_ids()
+        recipe_ids = self.recipes(user_ids)
+        self.relations(user_ids, recipe_ids)
+        self.derived(user_ids)
@@ -0,0 +1,148 @@
+"""Прогон сценариев: перцентили задержки, число запросов, сравнение."""
+import json
+import platform
+from time import perf_counter
+
+import django
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from foodgram.models import Favorite, Ingredient, Purchase, Recipe
+
+from .scenarios import Context
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(values, q):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(1, -(-q * len(ordered) // 100))
+    return ordered[rank - 1]
+
+
+class Runner:
+
+    def __init__(self, iterations=30, warmup=3, cold_cache=False,
+                 stdout=None):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.cold_cache = cold_cache
+        self.stdout = stdout
+        self.context = Context()
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message + '\n')
+
+    def _client(self, scenario):
+        headers = {'HTTP_HOST': 'localhost'}
+        if scenario.auth:
+            headers['HTTP_AUTHORIZATION'] = f'Token {self.context.token}'
+        return Client(**headers)
+
+    def _request(self, client, scenario, iteration):
+        path, body = scenario.request(self.context, iteration)
+        if body is None:
+            response = client.generic(scenario.method.upper(), path)
+        else:
+            response = client.generic(
+                scenario.method.upper(), path, json.dumps(body),
+                content_type='application/json'
+            )
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        if response.status_code != scenario.status:
+            raise AssertionError(
+                f'{scenario.name}: {scenario.method.upper()} {path} '
+                f'вернул {response.status_code}, '
+                f'ожидался {scenario.status}'
+            )
+
+    def run_scenario(self, scenario):
+        client = self._client(scenario)
+        if scenario.setup:
+            scenario.setup(self.context)
+        timings, queries = [], []
+        try:
+            for iteration in range(self.warmup):
+                self._request(client, scenario, -1 - iteration)
+            for iteration in range(self.iterations):
+                if self.cold_cache:
+                    cache.clear()
+                with CaptureQueriesContext(connection) as captured:
+                    start = perf_counter()
+                    self._request(client, scenario, iteration)
+                    timings.append((perf_counter() - start) * 1000)
+                queries.append(len(captured))
+        finally:
+            if scenario.teardown:
+                scenario.teardown(self.context)
+        result = {
+            f'p{q}': round(percentile(timings, q), 2) for q in PERCENTILES
+        }
+        result.update({
+            'mean': round(sum(timings) / len(timings), 2),
+            'min': round(min(timings), 2),
+            'max': round(max(timings), 2),
+            'queries': percentile(queries, 50),
+            'queries_max': max(queries),
+            'iterations': len(timings),
+        })
+        return result
+
+    def run(self, scenarios):
+        results = {}
+        for scenario in scenarios:
+            results[scenario.name] = self.run_scenario(scenario)
+            result = results[scenario.name]
+            self.log(
+                f'{scenario.name:<32} p50 {result["p50"]:>8.2f} ms  '
+                f'p95 {result["p95"]:>8.2f} ms  '
+                f'p99 {result["p99"]:>8.2f} ms  '
+                f'queries {result["queries"]}'
+            )
+        return {'meta': self.meta(), 'results': results}
+
+    def meta(self):
+        return {
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'iterations': self.iterations,
+            'cold_cache': self.cold_cache,
+            'rows': {
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+                'favorites': Favorite.objects.count(),
+                'carts': Purchase.objects.count(),
+            },
+        }
+
+
+def compare(report, baseline, tolerance=0.2, metric='p95'):
+    """Строки сравнения с базовым прогоном и признак регрессии.
+
+    Регрессия — рост metric больше чем на tolerance или рост медианного
+    числа запросов.
+    """
+    rows = []
+    for name, result in report['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            rows.append((name, result[metric], None, None, False))
+            continue
+        change = (
+            (result[metric] - base[metric]) / base[metric]
+            if base[metric] else 0.0
+        )
+        regression = (
+            change > tolerance or result['queries'] > base['queries']
+        )
+        rows.append((name, result[metric], base[metric], change, regression))
+    return rows
@@ -0,0 +1,206 @@
+"""Сценарии замеров: горячие эндпоинты API.
+
+Сценарий — имя, метод, путь и тело запроса; путь и тело могут зависеть
+от контекста (id рецептов, тегов, пользователей из текущей базы) и номера
+итерации. setup/teardown подготавливают и убирают создаваемые объекты.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count
+from rest_framework.authtoken.models import Token
+
+from api.paginators import RecipesCustomPagination
+from foodgram.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+from .datagen import IMAGE_NAME
+
+User = get_user_model()
+BENCH_RECIPE_PREFIX = 'Замер'
+
+
+class Context:
+    """Данные базы, к которым обращаются сценарии."""
+
+    def __init__(self):
+        bench_users = User.objects.filter(
+            email__startswith='bench', email__endswith='@example.com'
+        )
+        self.user = bench_users.annotate(
+            carts=Count('purchase')
+        ).filter(carts__gt=0).order_by('-carts').first() or (
+            bench_users.order_by('id').first()
+        )
+        if self.user is None:
+            raise RuntimeError(
+                'В базе нет данных для замеров, запустите '
+                '"python -m benchmarks generate"'
+            )
+        self.token = Token.objects.get_or_create(user=self.user)[0].key
+        self.tags = list(Tag.objects.order_by('id').values_list(
+            'slug', flat=True
+        ))
+        self.tag_ids = list(Tag.objects.order_by('id').values_list(
+            'id', flat=True
+        ))
+        self.recipe_ids = list(Recipe.objects.order_by('-id').values_list(
+            'id', flat=True
+        )[:1000])
+        self.author_id = Recipe.objects.values('author').annotate(
+            total=Count('id')
+        ).order_by('-total').values_list('author', flat=True)[0]
+        self.ingredient_ids = list(Ingredient.objects.order_by(
+            'id'
+        ).values_list('id', flat=True)[:50])
+        # Последняя страница ленты: самый большой OFFSET в этой базе.
+        self.deep_page = max(1, -(
+            -Recipe.objects.count() // RecipesCustomPagination.page_size
+        ))
+        self.update_recipe_id = None
+
+    def recipe_id(self, iteration):
+        return self.recipe_ids[iteration % len(self.recipe_ids)]
+
+    def recipe_body(self, name, iteration=0):
+        """Тело рецепта; от итерации зависят количества и часть состава."""
+        ingredient_ids = self.ingredient_ids[iteration % 3:][:6]
+        return {
+            'name': name,
+            'text': 'Описание рецепта для замера',
+            'cooking_time': 30,
+            'tags': self.tag_ids[:2],
+            'ingredients': [
+                {'id': pk, 'amount': 10 + number + iteration % 5}
+                for number, pk in enumerate(ingredient_ids)
+            ],
+            'image': PIXEL,
+        }
+
+
+PIXEL = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1Pe'
+    'AAAADElEQVR4nGP4z8AAAAMBAQDJ/pLvAAAAAElFTkSuQmCC'
+)
+
+
+class Scenario:
+
+    def __init__(self, name, path, method='get', auth=True, body=None,
+                 setup=None, teardown=None, status=200):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.auth = auth
+        self.body = body
+        self.setup = setup
+        self.teardown = teardown
+        self.status = status
+
+    def request(self, context, iteration):
+        path = self.path
+        if callable(path):
+            path = path(context, iteration)
+        body = self.body
+        if callable(body):
+            body = body(context, iteration)
+        return path, body
+
+
+def _delete_bench_recipes(context):
+    Recipe.objects.filter(name__startswith=BENCH_RECIPE_PREFIX).delete()
+
+
+def _create_recipe_to_update(context):
+    _delete_bench_recipes(context)
+    recipe = Recipe.objects.create(
+        author=context.user, name=f'{BENCH_RECIPE_PREFIX} обновление',
+        text='Исходный текст', cooking_time=10, image=IMAGE_NAME
+    )
+    recipe.tags.set(context.tag_ids[:1])
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(recipe=recipe, ingredient_id=pk, amount=1)
+        for pk in context.ingredient_ids[:6]
+    ])
+    context.update_recipe_id = recipe.id
+
+
+def _update_body(context, iteration):
+    body = context.recipe_body(
+        f'{BENCH_RECIPE_PREFIX} обновление', iteration
+    )
+    del body['image']
+    return body
+
+
+def _list(name, query='', auth=True):
+    return Scenario(name, f'/api/recipes/?{query}', auth=auth)
+
+
+def recipe_list_scenarios():
+    tag = lambda ctx: ctx.tags[0]  # noqa: E731
+    two_tags = lambda ctx: '&'.join(  # noqa: E731
+        f'tags={slug}' for slug in ctx.tags[:2]
+    )
+    return [
+        _list('recipes.list.anon', auth=False),
+        _list('recipes.list'),
+        _list('recipes.list.limit_20', 'limit=20'),
+        Scenario('recipes.list.deep_page',
+                 lambda ctx, i: f'/api/recipes/?page={ctx.deep_page}'),
+        _list('recipes.list.cursor', 'pagination=cursor'),
+        Scenario('recipes.list.tag',
+                 lambda ctx, i: f'/api/recipes/?tags={tag(ctx)}'),
+        Scenario('recipes.list.tags_any',
+                 lambda ctx, i: f'/api/recipes/?{two_tags(ctx)}'),
+        Scenario('recipes.list.tags_all',
+                 lambda ctx, i: f'/api/recipes/?{two_tags(ctx)}'
+                                '&tags_match=all'),
+        Scenario('recipes.list.author',
+                 lambda ctx, i: f'/api/recipes/?author={ctx.author_id}'),
+        Scenario('recipes.list.author_tag',
+                 lambda ctx, i: f'/api/recipes/?author={ctx.author_id}'
+                                f'&tags={tag(ctx)}'),
+        _list('recipes.list.favorited', 'is_favorited=1'),
+        _list('recipes.list.in_cart', 'is_in_shopping_cart=1'),
+        Scenario('recipes.list.favorited_tag',
+                 lambda ctx, i: f'/api/recipes/?is_favorited=1'
+                                f'&tags={tag(ctx)}'),
+        _list('recipes.list.search', 'search=суп'),
+        Scenario('recipes.list.search_tag',
+                 lambda ctx, i: f'/api/recipes/?search=пирог'
+                                f'&tags={tag(ctx)}'),
+    ]
+
+
+def all_scenarios():
+    return [
+        *recipe_list_scenarios(),
+        Scenario('recipes.detail.anon',
+                 lambda ctx, i: f'/api/recipes/{ctx.recipe_id(i)}/',
+                 auth=False),
+        Scenario('recipes.detail',
+                 lambda ctx, i: f'/api/recipes/{ctx.recipe_id(i)}/'),
+        Scenario(
+            'recipes.create', '/api/recipes/', method='post',
+            body=lambda ctx, i: ctx.recipe_body(
+                f'{BENCH_RECIPE_PREFIX} {i}', i
+            ),
+            setup=_delete_bench_recipes, teardown=_delete_bench_recipes,
+            status=201
+        ),
+        Scenario(
+            'recipes.update',
+            lambda ctx, i: f'/api/recipes/{ctx.update_recipe_id}/',
+            method='patch', body=_update_body,
+            setup=_create_recipe_to_update, teardown=_delete_bench_recipes
+        ),
+        Scenario('subscriptions', '/api/users/subscriptions/'),
+        Scenario('subscriptions.recipes_limit',
+                 '/api/users/subscriptions/?recipes_limit=10'),
+        Scenario('ingredients.search', '/api/ingredients/?name=мук'),
+        Scenario('ingredients.search.short', '/api/ingredients/?name=с'),
+        Scenario('shopping_cart.txt',
+                 '/api/recipes/download_shopping_cart/?format=txt'),
+        Scenario('shopping_cart.csv',
+                 '/api/recipes/download_shopping_cart/?format=csv'),
+        Scenario('shopping_cart.pdf',
+                 '/api/recipes/download_shopping_cart/?format=pdf'),
+    ]
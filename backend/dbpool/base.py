@@ -0,0 +1,44 @@
+from functools import partial
+
+from .pool import PoolTimeout, get_pool
+
+
+class PooledDatabaseWrapperMixin:
+    """Берёт соединение из пула и возвращает его туда вместо закрытия."""
+    _checkout = None
+
+    @property
+    def pool_enabled(self):
+        return True
+
+    def get_new_connection(self, conn_params):
+        if not self.pool_enabled:
+            return super().get_new_connection(conn_params)
+        pool = get_pool(self.alias, self.settings_dict)
+        try:
+            self._checkout = pool.acquire(
+                partial(super().get_new_connection, conn_params),
+                self.is_connection_alive
+            )
+        except PoolTimeout as error:
+            raise self.Database.OperationalError(str(error)) from error
+        return self._checkout.connection
+
+    def _close(self):
+        checkout, self._checkout = self._checkout, None
+        if checkout is None or checkout.connection is not self.connection:
+            return super()._close()
+        reusable = (
+            not self.in_atomic_block
+            and not self.errors_occurred
+            and self.reset_connection(self.connection)
+        )
+        checkout.pool.release(checkout, reusable)
+
+    def is_connection_alive(self, connection):
+        """Проверка свободного соединения перед повторной выдачей."""
+        raise NotImplementedError
+
+    def reset_connection(self, connection):
+        """Откатывает незавершённую транзакцию; False — соединение негодно."""
+        raise NotImplementedError
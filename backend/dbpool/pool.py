@@ -0,0 +1,168 @@
+"""Пул соединений с базой внутри процесса, общий для всех потоков.
+
+Django сам держит по соединению на поток и при CONN_MAX_AGE=0 закрывает
+его в конце запроса; обёртки из dbpool.*.base вместо этого берут
+соединение из пула и возвращают его обратно. Настройки — ключ POOL в
+DATABASES[alias], см. DEFAULTS.
+"""
+import os
+import threading
+from time import monotonic
+
+from metrics.registry import registry
+
+DEFAULTS = {
+    'MAX_SIZE': 20,
+    'TIMEOUT': 10,
+    'MAX_LIFETIME': 1800,
+    'CHECK_INTERVAL': 30,
+}
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class Checkout:
+    """Выданное соединение и то, что нужно знать о нём при возврате."""
+
+    def __init__(self, pool, connection, created_at):
+        self.pool = pool
+        self.connection = connection
+        self.created_at = created_at
+        self.taken_at = monotonic()
+
+
+class ConnectionPool:
+    """Ограниченный пул DBAPI-соединений одного алиаса в одном процессе.
+
+    Выдано одновременно не больше MAX_SIZE соединений, остальные ждут
+    до TIMEOUT секунд. Свободные соединения отдаются в порядке LIFO, чтобы
+    редко нужные успели устареть; старше MAX_LIFETIME закрываются, а
+    пролежавшие без дела дольше CHECK_INTERVAL проверяются перед выдачей.
+    """
+
+    def __init__(self, alias, options):
+        self.alias = alias
+        self.max_size = options['MAX_SIZE']
+        self.timeout = options['TIMEOUT']
+        self.max_lifetime = options['MAX_LIFETIME']
+        self.check_interval = options['CHECK_INTERVAL']
+        self.pid = os.getpid()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._in_use = 0
+
+    def acquire(self, connect, is_alive):
+        start = monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            registry.observe_pool(self.alias, timeouts=1)
+            raise PoolTimeout(
+                f'No free connection in pool "{self.alias}" '
+                f'after {self.timeout} s'
+            )
+        registry.observe_pool(self.alias, wait=monotonic() - start)
+        try:
+            checkout = self._take_idle(is_alive)
+            if checkout is None:
+                checkout = Checkout(self, connect(), monotonic())
+                registry.observe_pool(self.alias, opened=1)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+        return checkout
+
+    def _take_idle(self, is_alive):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, created_at, released_at = self._idle.pop()
+            now = monotonic()
+            if now - created_at > self.max_lifetime or (
+                now - released_at > self.check_interval
+                and not is_alive(connection)
+            ):
+                self._close(connection)
+                continue
+            return Checkout(self, connection, created_at)
+
+    def release(self, checkout, reusable):
+        if os.getpid() != self.pid:
+            # Соединение родителя после fork: закрытие оборвало бы его сессию.
+            _abandoned.append(checkout.connection)
+            return
+        now = monotonic()
+        registry.observe_pool(
+            self.alias, busy_seconds=now - checkout.taken_at
+        )
+        with self._lock:
+            self._in_use -= 1
+        try:
+            if reusable and now - checkout.created_at < self.max_lifetime:
+                with self._lock:
+                    self._idle.append(
+                        (checkout.connection, checkout.created_at, now)
+                    )
+            else:
+                self._close(checkout.connection)
+        finally:
+            self._slots.release()
+
+    def close_idle(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _, _ in idle:
+            self._close(connection)
+
+    def _close(self, connection):
+        registry.observe_pool(self.alias, closed=1)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_abandoned = []
+
+
+def get_pool(alias, settings_dict):
+    pool = _pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                options = {**DEFAULTS, **settings_dict.get('POOL', {})}
+                pool = _pools[alias] = ConnectionPool(alias, options)
+    return pool
+
+
+def close_idle():
+    for pool in list(_pools.values()):
+        pool.close_idle()
+
+
+def _after_fork_in_child():
+    # Выданные до fork соединения вернутся в старые пулы и будут брошены
+    # там (см. release), новые запросы получат свои пулы.
+    global _pools_lock
+    _pools.clear()
+    _pools_lock = threading.Lock()
+
+
+# Мастер gunicorn --preload закрывает свободные соединения перед fork,
+# чтобы воркеры не делили с ним сокеты.
+os.register_at_fork(before=close_idle, after_in_child=_after_fork_in_child)
@@ -0,0 +1,29 @@
+from django.db.backends.sqlite3 import base
+
+from ..base import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """SQLite с пулом — локальная замена PostgreSQL для замеров и проверок.
+
+    Базы в памяти не пулятся: каждое новое соединение к ним — новая база.
+    """
+
+    @property
+    def pool_enabled(self):
+        return not self.is_in_memory_db()
+
+    def is_connection_alive(self, connection):
+        try:
+            connection.execute('SELECT 1')
+        except self.Database.Error:
+            return False
+        return True
+
+    def reset_connection(self, connection):
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except self.Database.Error:
+            return False
+        return True
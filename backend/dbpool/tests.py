@@ -0,0 +1,146 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.db import connections
+from django.db.utils import OperationalError, load_backend
+from django.test import SimpleTestCase
+
+from . import pool
+from .pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**options):
+    return ConnectionPool('test', {**pool.DEFAULTS, **options})
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+    def test_reuses_released_connection_lifo(self):
+        connection_pool = make_pool()
+        first = connection_pool.acquire(FakeConnection, lambda c: True)
+        second = connection_pool.acquire(FakeConnection, lambda c: True)
+        connection_pool.release(first, reusable=True)
+        connection_pool.release(second, reusable=True)
+        again = connection_pool.acquire(FakeConnection, lambda c: True)
+        self.assertIs(again.connection, second.connection)
+        self.assertEqual(
+            connection_pool.stats(), {'max_size': 20, 'in_use': 1, 'idle': 1}
+        )
+
+    def test_waits_no_longer_than_timeout(self):
+        connection_pool = make_pool(MAX_SIZE=1, TIMEOUT=0.05)
+        checkout = connection_pool.acquire(FakeConnection, lambda c: True)
+        with self.assertRaises(PoolTimeout):
+            connection_pool.acquire(FakeConnection, lambda c: True)
+        connection_pool.release(checkout, reusable=True)
+        self.assertIs(
+            connection_pool.acquire(FakeConnection, lambda c: True).connection,
+            checkout.connection
+        )
+
+    def test_failed_connect_frees_slot(self):
+        connection_pool = make_pool(MAX_SIZE=1, TIMEOUT=0.05)
+
+        def connect():
+            raise OSError('connection refused')
+
+        with self.assertRaises(OSError):
+            connection_pool.acquire(connect, lambda c: True)
+        connection_pool.acquire(FakeConnection, lambda c: True)
+
+    def test_not_reusable_is_closed(self):
+        connection_pool = make_pool()
+        checkout = connection_pool.acquire(FakeConnection, lambda c: True)
+        connection_pool.release(checkout, reusable=False)
+        self.assertTrue(checkout.connection.closed)
+        self.assertEqual(connection_pool.stats()['idle'], 0)
+
+    def test_closes_connections_past_lifetime(self):
+        connection_pool = make_pool(MAX_LIFETIME=60)
+        with mock.patch.object(pool, 'monotonic', return_value=1000):
+            checkout = connection_pool.acquire(FakeConnection, lambda c: True)
+            connection_pool.release(checkout, reusable=True)
+        with mock.patch.object(pool, 'monotonic', return_value=1061):
+            fresh = connection_pool.acquire(FakeConnection, lambda c: True)
+        self.assertTrue(checkout.connection.closed)
+        self.assertIsNot(fresh.connection, checkout.connection)
+
+    def test_checks_long_idle_connections(self):
+        connection_pool = make_pool(CHECK_INTERVAL=30)
+        with mock.patch.object(pool, 'monotonic', return_value=1000):
+            checkout = connection_pool.acquire(FakeConnection, lambda c: True)
+            connection_pool.release(checkout, reusable=True)
+        with mock.patch.object(pool, 'monotonic', return_value=1010):
+            again = connection_pool.acquire(FakeConnection, lambda c: False)
+            self.assertIs(again.connection, checkout.connection)
+            connection_pool.release(again, reusable=True)
+        with mock.patch.object(pool, 'monotonic', return_value=1041):
+            fresh = connection_pool.acquire(FakeConnection, lambda c: False)
+        self.assertTrue(checkout.connection.closed)
+        self.assertIsNot(fresh.connection, checkout.connection)
+
+
+class PooledSQLiteTest(SimpleTestCase):
+    """Обёртка dbpool.sqlite3 над файловой базой."""
+
+    alias = 'pool_test'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings_dict = {
+            **connections['default'].settings_dict,
+            'ENGINE': 'dbpool.sqlite3',
+            'NAME': os.path.join(directory.name, 'pool.sqlite3'),
+            'POOL': {'MAX_SIZE': 1, 'TIMEOUT': 0},
+        }
+        self.addCleanup(self.drop_pool)
+
+    def drop_pool(self):
+        connection_pool = pool._pools.pop(self.alias, None)
+        if connection_pool is not None:
+            connection_pool.close_idle()
+
+    def wrapper(self):
+        backend = load_backend(self.settings_dict['ENGINE'])
+        wrapper = backend.DatabaseWrapper(self.settings_dict, self.alias)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_close_returns_connection_to_pool(self):
+        first = self.wrapper()
+        first.ensure_connection()
+        raw = first.connection
+        first.close()
+        second = self.wrapper()
+        second.ensure_connection()
+        self.assertIs(second.connection, raw)
+
+    def test_pool_size_is_enforced(self):
+        first = self.wrapper()
+        first.ensure_connection()
+        with self.assertRaises(OperationalError):
+            self.wrapper().ensure_connection()
+        first.close()
+        self.wrapper().ensure_connection()
+
+    def test_open_transaction_is_rolled_back_on_release(self):
+        first = self.wrapper()
+        with first.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id integer)')
+        first.connection.execute('BEGIN')
+        first.connection.execute('INSERT INTO item VALUES (1)')
+        first.close()
+        second = self.wrapper()
+        with second.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM item')
+            self.assertEqual(cursor.fetchone(), (0,))
@@ -1,23 +1,106 @@
 from django.contrib import admin
+from django.db import transaction
 
+from . import fulltext, shopping_cart
+from .admin_utils import AuthorFilter, LargeTableAdmin, UserFilter
 from .models import (Favorite, Ingredient, Purchase, Recipe, RecipeIngredient,
                      Subscription, Tag)
 
 
-class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author')
-    list_filter = ('author', 'name', 'tags',)
+class RecipeIngredientInline(admin.TabularInline):
+    model = RecipeIngredient
+    autocomplete_fields = ('ingredient',)
+    extra = 0
 
 
-class IngredientAdmin(admin.ModelAdmin):
+class RecipeAdmin(LargeTableAdmin):
+    list_display = ('name', 'author', 'favorites_count', 'pub_date')
+    list_filter = (AuthorFilter, 'tags',)
+    list_select_related = ('author',)
+    search_fields = ('^name',)
+    autocomplete_fields = ('author', 'tags')
+    readonly_fields = ('favorites_count', 'in_carts_count')
+    inlines = (RecipeIngredientInline,)
+
+    def save_related(self, request, form, formsets, change):
+        # Состав из инлайна ещё не сохранён: прежние количества в базе.
+        # Поисковый документ обновит сигнал сохранения рецепта.
+        recipe_id = form.instance.id
+        old_amounts = shopping_cart.recipe_amounts(recipe_id) if change else {}
+        super().save_related(request, form, formsets, change)
+        if change:
+            shopping_cart.update_recipe(
+                recipe_id, old_amounts, shopping_cart.recipe_amounts(recipe_id)
+            )
+
+
+class IngredientAdmin(LargeTableAdmin):
     list_display = ('name', 'measurement_unit')
-    list_filter = ('name',)
+    search_fields = ('^name',)
+
+
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug', 'color')
+    search_fields = ('name', 'slug')
+
+
+class UserRecipeAdmin(LargeTableAdmin):
+    list_display = ('user', 'recipe')
+    list_filter = (UserFilter,)
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+
+
+class SubscriptionAdmin(LargeTableAdmin):
+    list_display = ('user', 'subscribed_to')
+    list_filter = (UserFilter,)
+    list_select_related = ('user', 'subscribed_to')
+    autocomplete_fields = ('user', 'subscribed_to')
+
+
+class RecipeIngredientAdmin(LargeTableAdmin):
+    list_display = ('recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
+
+    def old_amounts(self, recipe_ids):
+        return {
+            recipe_id: shopping_cart.recipe_amounts(recipe_id)
+            for recipe_id in set(recipe_ids)
+        }
+
+    def recipes_changed(self, old_amounts):
+        """Переносит изменение состава в корзины и поисковый индекс."""
+        for recipe_id, amounts in old_amounts.items():
+            shopping_cart.update_recipe(
+                recipe_id, amounts, shopping_cart.recipe_amounts(recipe_id)
+            )
+        transaction.on_commit(lambda: fulltext.reindex(old_amounts))
+
+    def save_model(self, request, obj, form, change):
+        old_amounts = self.old_amounts(
+            [obj.recipe_id, form.initial.get('recipe', obj.recipe_id)]
+        )
+        super().save_model(request, obj, form, change)
+        self.recipes_changed(old_amounts)
+
+    def delete_model(self, request, obj):
+        old_amounts = self.old_amounts([obj.recipe_id])
+        super().delete_model(request, obj)
+        self.recipes_changed(old_amounts)
+
+    def delete_queryset(self, request, queryset):
+        old_amounts = self.old_amounts(
+            queryset.values_list('recipe', flat=True)
+        )
+        super().delete_queryset(request, queryset)
+        self.recipes_changed(old_amounts)
 
 
-admin.site.register(Tag)
+admin.site.register(Tag, TagAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Recipe, RecipeAdmin)
-admin.site.register(Subscription)
-admin.site.register(RecipeIngredient)
-admin.site.register(Favorite)
-admin.site.register(Purchase)
+admin.site.register(Subscription, SubscriptionAdmin)
+admin.site.register(RecipeIngredient, RecipeIngredientAdmin)
+admin.site.register(Favorite, UserRecipeAdmin)
+admin.site.register(Purchase, UserRecipeAdmin)
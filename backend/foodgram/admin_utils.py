@@ -0,0 +1,119 @@
+"""Общие части админки для больших таблиц."""
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimate_count(queryset):
+    """Оценка числа строк таблицы по статистике PostgreSQL.
+
+    Для других СУБД возвращает None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [connection.ops.quote_name(queryset.model._meta.db_table)]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, который не делает COUNT(*) по большой таблице.
+
+    Для нефильтрованного списка берётся оценка из pg_class, если она
+    больше threshold; иначе и для отфильтрованных списков - точный count.
+    """
+    threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_count(queryset)
+            if estimate is not None and estimate > self.threshold:
+                return estimate
+        return super().count
+
+
+class AutocompleteFilter(admin.SimpleListFilter):
+    """Фильтр по внешнему ключу с виджетом автодополнения админки.
+
+    parameter_name — имя поля. Варианты подгружает autocomplete_view по
+    search_fields админки связанной модели, а не боковая панель целиком.
+    """
+    template = 'admin/autocomplete_filter.html'
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        field = model._meta.get_field(self.parameter_name)
+        self.target_field = field.target_field
+        self.form_field = forms.ModelChoiceField(
+            queryset=field.related_model._default_manager.all(),
+            widget=AutocompleteSelect(field, model_admin.admin_site, attrs={
+                'onchange': 'this.form.submit()',
+                'style': 'width: 90%',
+            }),
+            required=False
+        )
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            value = self.target_field.to_python(self.value())
+        except ValidationError as error:
+            raise IncorrectLookupParameters(error)
+        return queryset.filter(**{self.parameter_name: value})
+
+    def choices(self, changelist):
+        yield {
+            'widget': self.form_field.widget.render(
+                self.parameter_name, self.value(),
+                attrs={'id': f'id_filter_{self.parameter_name}'}
+            ),
+            'query_parts': [
+                (key, value)
+                for key, value in changelist.get_filters_params().items()
+                if key != self.parameter_name
+            ],
+        }
+
+
+class AuthorFilter(AutocompleteFilter):
+    title = 'автору'
+    parameter_name = 'author'
+
+
+class UserFilter(AutocompleteFilter):
+    title = 'пользователю'
+    parameter_name = 'user'
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @property
+    def media(self):
+        media = super().media
+        if any(
+            isinstance(spec, type) and issubclass(spec, AutocompleteFilter)
+            for spec in self.list_filter
+        ):
+            media += AutocompleteSelect(None, self.admin_site).media
+        return media
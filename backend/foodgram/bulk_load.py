@@ -0,0 +1,584 @@
+"""Потоковая загрузка ингредиентов, тегов, пользователей и рецептов.
+
+Источник — CSV или NDJSON, читается построчно и пишется пачками, каждая
+в своей транзакции. Записи сопоставляются с существующими по
+естественному ключу (upsert), поэтому повторный запуск ничего не
+дублирует. После каждой пачки сохраняется контрольная точка — число
+обработанных записей, с которого продолжится прерванная загрузка.
+
+Плоские таблицы на PostgreSQL пишутся через COPY во временную таблицу и
+слияние UPDATE ... FROM / INSERT ... WHERE NOT EXISTS, на остальных СУБД
+— через bulk_update и bulk_create. Тяжёлая работа без базы (декодирование
+изображений, хэширование паролей) идёт в пуле процессов.
+"""
+import base64
+import binascii
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from . import (counters, fulltext, generations, images, ingredient_index,
+               shopping_cart, versions)
+from .models import Ingredient, Purchase, Recipe, RecipeIngredient, Tag
+
+User = get_user_model()
+
+LIST_SEPARATOR = '|'
+ITEM_SEPARATOR = ':'
+
+
+class LoadError(ValueError):
+    pass
+
+
+def read_records(path, fields, file_format=None):
+    """Отдаёт записи-словари; у CSV заголовок необязателен."""
+    if file_format is None:
+        file_format = (
+            'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+        )
+    with open(path, encoding='utf-8', newline='') as source:
+        if file_format == 'ndjson':
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        rows = csv.reader(source)
+        first = next(rows, None)
+        if first is None:
+            return
+        if set(first) & set(fields):
+            header = first
+        else:
+            header = fields
+            yield dict(zip(header, first))
+        for row in rows:
+            yield dict(zip(header, row))
+
+
+def _split(value):
+    if isinstance(value, list):
+        return value
+    return [item for item in (value or '').split(LIST_SEPARATOR) if item]
+
+
+def hash_password(password):
+    try:
+        identify_hasher(password)
+    except ValueError:
+        return make_password(password)
+    return password
+
+
+def prepare_image(value, base_dir, current=''):
+    """Декодирует изображение и строит копии; выполняется в пуле процессов.
+
+    value — data URI, base64 или путь к файлу относительно base_dir.
+    Имена файлов строятся по хэшу содержимого; если current — файл с тем
+    же хэшем, изображение не изменилось и возвращается None.
+    """
+    if not value:
+        return None
+    if value.startswith('data:') or ';base64,' in value:
+        data = base64.b64decode(value.split(';base64,')[-1])
+    elif os.path.exists(os.path.join(base_dir, value)):
+        with open(os.path.join(base_dir, value), 'rb') as source:
+            data = source.read()
+    else:
+        try:
+            data = base64.b64decode(value, validate=True)
+        except binascii.Error:
+            raise LoadError(f'Изображение {value} не найдено')
+    stem = hashlib.sha256(data).hexdigest()[:32]
+    if os.path.basename(current).startswith(stem):
+        return None
+    image = Image.open(io.BytesIO(data))
+    extension = (image.format or 'png').lower()
+    image = ImageOps.exif_transpose(image)
+    image.load()
+    files = {'image': (f'recipe_img/{stem}.{extension}', data)}
+    for name, (size, image_format, ext) in images.RENDITIONS.items():
+        files[f'image_{name}'] = (
+            f'{images.UPLOAD_TO}{stem}_{name}.{ext}',
+            images.render(image, size, image_format).read()
+        )
+    return files
+
+
+def prepare_image_or_error(value, current, base_dir):
+    try:
+        return prepare_image(value, base_dir, current)
+    except (LoadError, OSError, ValueError) as error:
+        return error
+
+
+class BaseLoader:
+    model = None
+    key_fields = ()
+    fields = ()
+    # Значения для новых строк, если у столбца нет умолчания в базе.
+    create_defaults = {}
+
+    def __init__(self, executor=None, using='default', base_dir='.'):
+        self.executor = executor
+        self.using = using
+        self.base_dir = base_dir
+        self.errors = []
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def _map(self, function, *items):
+        if self.executor is None:
+            return [function(*args) for args in zip(*items)]
+        return list(self.executor.map(function, *items, chunksize=16))
+
+    def clean(self, record):
+        return {field: record.get(field, '') for field in self.fields}
+
+    def prepare(self, records):
+        rows = []
+        for record in records:
+            try:
+                rows.append(self.clean(record))
+            except (KeyError, TypeError, ValueError) as error:
+                self.errors.append(f'{record}: {error}')
+        return rows
+
+    def key(self, row):
+        return tuple(row[field] for field in self.key_fields)
+
+    def write(self, rows):
+        rows = list({self.key(row): row for row in rows}.values())
+        if self.connection.vendor == 'postgresql':
+            self._copy_upsert(rows)
+        else:
+            self._bulk_upsert(rows)
+        return rows
+
+    def discard(self):
+        """Убирает следы пачки, транзакция которой откатилась."""
+
+    def _existing(self, rows):
+        lookup = {
+            f'{field}__in': {row[field] for row in rows}
+            for field in self.key_fields
+        }
+        return {
+            tuple(getattr(obj, field) for field in self.key_fields): obj
+            for obj in self.model.objects.using(self.using).filter(**lookup)
+        }
+
+    def _bulk_upsert(self, rows):
+        existing = self._existing(rows)
+        to_create, to_update = [], []
+        for row in rows:
+            obj = existing.get(self.key(row))
+            if obj is None:
+                to_create.append(self.model(**row))
+                continue
+            for field, value in row.items():
+                setattr(obj, field, value)
+            to_update.append(obj)
+        update_fields = [
+            field for field in self.fields if field not in self.key_fields
+        ]
+        manager = self.model.objects.using(self.using)
+        if to_update and update_fields:
+            manager.bulk_update(to_update, update_fields)
+        if to_create:
+            manager.bulk_create(to_create)
+
+    def _copy_upsert(self, rows):
+        table = self.model._meta.db_table
+        staging = f'load_{table}'
+        columns = [self.model._meta.get_field(f).column for f in self.fields]
+        keys = [self.model._meta.get_field(f).column for f in self.key_fields]
+        column_list = ', '.join(columns)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row[field] for field in self.fields])
+        buffer.seek(0)
+        match = ' AND '.join(f'{table}.{key} = {staging}.{key}'
+                             for key in keys)
+        assignments = ', '.join(f'{column} = {staging}.{column}'
+                                for column in columns if column not in keys)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE {staging} ON COMMIT DROP AS '
+                f'SELECT {column_list} FROM {table} WITH NO DATA'
+            )
+            cursor.copy_expert(
+                f'COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+            if assignments:
+                cursor.execute(
+                    f'UPDATE {table} SET {assignments} '
+                    f'FROM {staging} WHERE {match}'
+                )
+            defaults = [
+                (self.model._meta.get_field(field).column, value)
+                for field, value in self.create_defaults.items()
+            ]
+            insert_columns = ', '.join(
+                [*columns, *(column for column, _ in defaults)]
+            )
+            select_columns = ', '.join(
+                [*columns, *('%s' for _ in defaults)]
+            )
+            cursor.execute(
+                f'INSERT INTO {table} ({insert_columns}) '
+                f'SELECT {select_columns} FROM {staging} WHERE NOT EXISTS '
+                f'(SELECT 1 FROM {table} WHERE {match})',
+                [value for _, value in defaults]
+            )
+
+    def finish(self):
+        """Вызывается после загрузки всех пачек."""
+
+
+class IngredientLoader(BaseLoader):
+    model = Ingredient
+    key_fields = ('name', 'measurement_unit')
+    fields = ('name', 'measurement_unit')
+
+    def clean(self, record):
+        return {
+            'name': record['name'].strip(),
+            'measurement_unit': record['measurement_unit'].strip(),
+        }
+
+    def finish(self):
+        ingredient_index.invalidate()
+
+
+class TagLoader(BaseLoader):
+    model = Tag
+    key_fields = ('slug',)
+    fields = ('name', 'color', 'slug')
+
+    def clean(self, record):
+        return {
+            'name': record['name'],
+            'color': record['color'].upper(),
+            'slug': record['slug'],
+        }
+
+    def finish(self):
+        versions.bump_version('tags')
+
+
+class UserLoader(BaseLoader):
+    model = User
+    key_fields = ('email',)
+    fields = ('email', 'username', 'first_name', 'last_name', 'password')
+    create_defaults = {
+        'is_active': True,
+        'is_staff': False,
+        'is_admin': False,
+        'recipes_count': 0,
+        'followers_count': 0,
+    }
+
+    def prepare(self, records):
+        rows = super().prepare(records)
+        passwords = self._map(hash_password, [row['password'] for row in rows])
+        for row, password in zip(rows, passwords):
+            row['password'] = password
+        return rows
+
+    def write(self, rows):
+        rows = super().write(rows)
+        generations.invalidate_recipes(Recipe.objects.using(
+            self.using
+        ).filter(author__email__in=[row['email'] for row in rows]))
+        return rows
+
+    def clean(self, record):
+        return {
+            'email': User.objects.normalize_email(record['email']),
+            'username': record['username'],
+            'first_name': record.get('first_name', ''),
+            'last_name': record.get('last_name', ''),
+            'password': record['password'],
+        }
+
+
+class RecipeLoader(BaseLoader):
+    """Рецепты со ссылками на автора (email), теги (слаги) и ингредиенты.
+
+    В CSV списки разделяются «|», ингредиент — «название:единица:количество».
+    В NDJSON tags — список слагов, ingredients — список объектов с полями
+    name, measurement_unit и amount.
+    """
+    model = Recipe
+    key_fields = ('name',)
+    fields = ('name', 'text', 'cooking_time', 'author', 'tags',
+              'ingredients', 'image')
+    image_fields = ('image', *images.RENDITION_FIELDS)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.storage = Recipe._meta.get_field('image').storage
+        self.new_files = []
+
+    def clean(self, record):
+        ingredients = []
+        for item in _split(record.get('ingredients')):
+            if isinstance(item, str):
+                name, measurement_unit, amount = item.rsplit(
+                    ITEM_SEPARATOR, 2
+                )
+                item = {'name': name, 'measurement_unit': measurement_unit,
+                        'amount': amount}
+            ingredients.append((
+                (item['name'].strip(), item['measurement_unit'].strip()),
+                int(item['amount'])
+            ))
+        return {
+            'name': record['name'],
+            'text': record['text'],
+            'cooking_time': int(record['cooking_time']),
+            'author': User.objects.normalize_email(record['author']),
+            'tags': _split(record.get('tags')),
+            'ingredients': ingredients,
+            'image': record.get('image') or '',
+        }
+
+    def prepare(self, records):
+        rows = super().prepare(records)
+        current = dict(Recipe.objects.using(self.using).filter(
+            name__in=[row['name'] for row in rows]
+        ).values_list('name', 'image'))
+        prepared = self._map(
+            partial(prepare_image_or_error, base_dir=self.base_dir),
+            [row['image'] for row in rows],
+            [current.get(row['name'], '') for row in rows]
+        )
+        result = []
+        for row, files in zip(rows, prepared):
+            if isinstance(files, Exception):
+                self.errors.append(f'{row["name"]}: {files}')
+                continue
+            row['image'] = files
+            result.append(row)
+        return result
+
+    def _resolve(self, rows):
+        authors = dict(User.objects.using(self.using).filter(
+            email__in={row['author'] for row in rows}
+        ).values_list('email', 'id'))
+        tags = dict(Tag.objects.using(self.using).filter(
+            slug__in={slug for row in rows for slug in row['tags']}
+        ).values_list('slug', 'id'))
+        names = {key[0] for row in rows for key, _ in row['ingredients']}
+        ingredients = {
+            (name, unit): pk
+            for pk, name, unit in Ingredient.objects.using(self.using).filter(
+                name__in=names
+            ).values_list('id', 'name', 'measurement_unit')
+        }
+        resolved = []
+        for row in rows:
+            missing = (
+                [row['author']] if row['author'] not in authors else []
+            ) + [
+                slug for slug in row['tags'] if slug not in tags
+            ] + [
+                ITEM_SEPARATOR.join(key)
+                for key, _ in row['ingredients'] if key not in ingredients
+            ]
+            if missing:
+                self.errors.append(f'{row["name"]}: не найдены {missing}')
+                continue
+            row['author'] = authors[row['author']]
+            row['tags'] = [tags[slug] for slug in row['tags']]
+            row['ingredients'] = {
+                ingredients[key]: amount for key, amount in row['ingredients']
+            }
+            resolved.append(row)
+        return resolved
+
+    def discard(self):
+        for name in self.new_files:
+            self.storage.delete(name)
+        self.new_files = []
+
+    def write(self, rows):
+        self.new_files = []
+        rows = list({row['name']: row for row in rows}.values())
+        rows = self._resolve(rows)
+        if not rows:
+            return rows
+        manager = Recipe.objects.using(self.using)
+        existing = manager.in_bulk([row['name'] for row in rows],
+                                   field_name='name')
+        authors = {recipe.author_id for recipe in existing.values()}
+        authors.update(row['author'] for row in rows)
+        to_create, to_update, stale = [], [], []
+        for row in rows:
+            recipe = existing.get(row['name']) or Recipe(name=row['name'])
+            recipe.text = row['text']
+            recipe.cooking_time = row['cooking_time']
+            recipe.author_id = row['author']
+            if row['image'] and recipe.pk:
+                stale.extend(
+                    getattr(recipe, field).name for field in self.image_fields
+                    if getattr(recipe, field)
+                )
+            for field, (name, content) in (row['image'] or {}).items():
+                name = self.storage.save(name, ContentFile(content))
+                self.new_files.append(name)
+                setattr(recipe, field, name)
+            (to_update if recipe.pk else to_create).append(recipe)
+        if to_update:
+            manager.bulk_update(
+                to_update,
+                ['text', 'cooking_time', 'author', *self.image_fields]
+            )
+        if to_create:
+            manager.bulk_create(to_create)
+        ids = dict(manager.filter(
+            name__in=[row['name'] for row in rows]
+        ).values_list('name', 'id'))
+        recipe_ids = list(ids.values())
+        old_amounts = {}
+        in_carts = set(Purchase.objects.using(self.using).filter(
+            recipe__in=[recipe.pk for recipe in to_update]
+        ).values_list('recipe', flat=True))
+        for recipe_id, ingredient_id, amount in RecipeIngredient.objects.using(
+            self.using
+        ).filter(recipe__in=in_carts).values_list(
+            'recipe', 'ingredient', 'amount'
+        ):
+            old_amounts.setdefault(recipe_id, {})[ingredient_id] = amount
+        generations.invalidate_recipes(manager.filter(id__in=recipe_ids))
+        RecipeTag = Recipe.tags.through
+        RecipeTag.objects.using(self.using).filter(
+            recipe__in=recipe_ids
+        ).delete()
+        RecipeTag.objects.using(self.using).bulk_create([
+            RecipeTag(recipe_id=ids[row['name']], tag_id=tag_id)
+            for row in rows for tag_id in set(row['tags'])
+        ])
+        RecipeIngredient.objects.using(self.using).filter(
+            recipe__in=recipe_ids
+        ).delete()
+        RecipeIngredient.objects.using(self.using).bulk_create([
+            RecipeIngredient(
+                recipe_id=ids[row['name']],
+                ingredient_id=ingredient_id,
+                amount=amount
+            )
+            for row in rows for ingredient_id, amount in row[
+                'ingredients'
+            ].items()
+        ])
+        for row in rows:
+            recipe_id = ids[row['name']]
+            if recipe_id in in_carts:
+                shopping_cart.update_recipe(
+                    recipe_id, old_amounts.get(recipe_id, {}),
+                    row['ingredients']
+                )
+        fulltext.reindex(recipe_ids)
+        counters.refresh('recipes_count', authors, using=self.using)
+        generations.invalidate(recipe_ids, authors, {
+            tag_id for row in rows for tag_id in row['tags']
+        })
+        # Прежние файлы заменённых изображений больше не нужны.
+        transaction.on_commit(
+            lambda: [self.storage.delete(name) for name in stale],
+            using=self.using
+        )
+        return rows
+
+
+LOADERS = {
+    'ingredients': IngredientLoader,
+    'tags': TagLoader,
+    'users': UserLoader,
+    'recipes': RecipeLoader,
+}
+
+
+class Checkpoint:
+    """Число обработанных записей файла, хранится рядом с ним."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self, source):
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        with open(self.path, encoding='utf-8') as checkpoint:
+            state = json.load(checkpoint)
+        return state['records'] if state.get('source') == source else 0
+
+    def save(self, source, records):
+        if not self.path:
+            return
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as checkpoint:
+            json.dump({'source': source, 'records': records}, checkpoint)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def load(loader, path, batch_size=1000, checkpoint=None, file_format=None,
+         progress=None):
+    """Загружает файл пачками; возвращает число записанных строк."""
+    checkpoint = checkpoint or Checkpoint(None)
+    source = os.path.abspath(path)
+    skip = checkpoint.load(source)
+    records = read_records(path, loader.fields, file_format)
+    consumed = 0
+    written = 0
+    started = time.monotonic()
+    batch = []
+    for record in records:
+        consumed += 1
+        if consumed <= skip:
+            continue
+        batch.append(record)
+        if len(batch) < batch_size:
+            continue
+        written += _write_batch(loader, batch)
+        checkpoint.save(source, consumed)
+        batch = []
+        if progress:
+            progress(consumed, written, time.monotonic() - started)
+    if batch:
+        written += _write_batch(loader, batch)
+        checkpoint.save(source, consumed)
+    loader.finish()
+    checkpoint.clear()
+    if progress:
+        progress(consumed, written, time.monotonic() - started)
+    return written
+
+
+def _write_batch(loader, batch):
+    rows = loader.prepare(batch)
+    try:
+        with transaction.atomic(using=loader.using):
+            return len(loader.write(rows))
+    except BaseException:
+        loader.discard()
+        raise
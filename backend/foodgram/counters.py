@@ -0,0 +1,68 @@
+"""Денормализованные счётчики популярности.
+
+Recipe.favorites_count, Recipe.in_carts_count, User.recipes_count и
+User.followers_count меняются атомарным UPDATE ... SET x = x + n из
+сигналов и массовых операций. repair() пересчитывает их по исходным
+таблицам пачками по диапазонам id.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Favorite, Purchase, Recipe, Subscription
+
+User = get_user_model()
+
+# поле счётчика: (модель счётчика, модель-источник, поле связи в источнике)
+COUNTERS = {
+    'favorites_count': (Recipe, Favorite, 'recipe'),
+    'in_carts_count': (Recipe, Purchase, 'recipe'),
+    'recipes_count': (User, Recipe, 'author'),
+    'followers_count': (User, Subscription, 'subscribed_to'),
+}
+
+
+def change(field, pks, delta=1):
+    """Прибавляет delta к счётчику field у объектов с id из pks."""
+    model = COUNTERS[field][0]
+    if not isinstance(pks, (list, tuple, set, frozenset)):
+        pks = [pks]
+    if pks and delta:
+        model.objects.filter(pk__in=pks).update(
+            **{field: Greatest(F(field) + delta, Value(0))}
+        )
+
+
+def _actual(field):
+    _, source, link = COUNTERS[field]
+    return Coalesce(Subquery(
+        source.objects.filter(
+            **{link: OuterRef('pk')}
+        ).order_by().values(link).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def refresh(field, pks, using=None):
+    """Пересчитывает счётчик у перечисленных объектов."""
+    model = COUNTERS[field][0]
+    model.objects.using(using).filter(pk__in=list(pks)).update(
+        **{field: _actual(field)}
+    )
+
+
+def repair(fields=None, batch_size=1000, progress=None):
+    """Пересчитывает счётчики всех объектов пачками по batch_size id."""
+    for field in fields or COUNTERS:
+        model = COUNTERS[field][0]
+        ids = model.objects.order_by('pk').values_list('pk', flat=True)
+        last_pk = 0
+        while True:
+            batch = list(ids.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            model.objects.filter(
+                pk__gte=batch[0], pk__lte=batch[-1]
+            ).update(**{field: _actual(field)})
+            last_pk = batch[-1]
+            if progress:
+                progress(field, last_pk)
@@ -0,0 +1,126 @@
+"""Полнотекстовый поиск рецептов.
+
+Документ рецепта — название, описание и названия ингредиентов. Он
+хранится в отдельной таблице foodgram_recipe_search, которую создаёт
+миграция 0008 под конкретную СУБД:
+
+* PostgreSQL: tsvector с весами A/B/C и GIN-индексом, словарь russian;
+* SQLite: виртуальная таблица FTS5. Русского стеммера в FTS5 нет, поэтому
+  слова запроса обрезаются до основы и ищутся по префиксу.
+
+Документ обновляется точечно сигналами: после коммита сохранения рецепта
+(через API, админку или shell — вместе с составом из той же транзакции)
+и при переименовании ингредиента — только у рецептов с этим ингредиентом.
+На остальных СУБД поиск сводится к icontains по названию и описанию.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe, RecipeIngredient
+
+TABLE = 'foodgram_recipe_search'
+_words = re.compile(r'\w+')
+
+POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector('russian', %s), 'A')"
+    " || setweight(to_tsvector('russian', %s), 'B')"
+    " || setweight(to_tsvector('russian', %s), 'C')"
+)
+
+
+def _write_connection():
+    return connections[router.db_for_write(Recipe)]
+
+
+def _fts5_query(query):
+    terms = []
+    for word in _words.findall(query.casefold().replace('ё', 'е')):
+        if len(word) > 4:
+            word = word[:max(4, len(word) - 2)]
+        terms.append(f'"{word}"*')
+    return ' '.join(terms)
+
+
+def index_recipe(recipe, ingredient_names):
+    connection = _write_connection()
+    values = [recipe.name, recipe.text, ' '.join(ingredient_names)]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f'INSERT INTO {TABLE} (recipe_id, document) '
+                f'VALUES (%s, {POSTGRES_DOCUMENT}) '
+                'ON CONFLICT (recipe_id) DO UPDATE '
+                'SET document = EXCLUDED.document',
+                [recipe.id, *values]
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s',
+                           [recipe.id])
+            cursor.execute(
+                f'INSERT INTO {TABLE} (rowid, name, text, ingredients) '
+                'VALUES (%s, %s, %s, %s)',
+                [recipe.id, *values]
+            )
+
+
+def remove_recipe(recipe_id):
+    connection = _write_connection()
+    if connection.vendor == 'sqlite':
+        # В PostgreSQL строку удаляет внешний ключ ON DELETE CASCADE.
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s',
+                           [recipe_id])
+
+
+def reindex(recipe_ids):
+    """Пересчитывает документы только у перечисленных рецептов."""
+    recipe_ids = list(recipe_ids)
+    ingredient_names = {recipe_id: [] for recipe_id in recipe_ids}
+    for recipe_id, name in RecipeIngredient.objects.filter(
+        recipe__in=recipe_ids
+    ).values_list('recipe', 'ingredient__name'):
+        ingredient_names[recipe_id].append(name)
+    recipes = Recipe.objects.filter(id__in=recipe_ids).only('name', 'text')
+    for recipe in recipes:
+        index_recipe(recipe, ingredient_names[recipe.id])
+    return len(recipes)
+
+
+def search(queryset, query):
+    """Фильтрует queryset по запросу и сортирует по релевантности."""
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = "websearch_to_tsquery('russian', %s)"
+        matches = RawSQL(
+            f'SELECT recipe_id FROM {TABLE} WHERE document @@ {tsquery}',
+            [query]
+        )
+        rank = RawSQL(
+            f'SELECT ts_rank(document, {tsquery}) FROM {TABLE} '
+            f'WHERE recipe_id = {Recipe._meta.db_table}.id',
+            [query],
+            output_field=FloatField()
+        )
+    elif vendor == 'sqlite':
+        query = _fts5_query(query)
+        if not query:
+            return queryset.none()
+        matches = RawSQL(
+            f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [query]
+        )
+        rank = RawSQL(
+            f'SELECT -bm25({TABLE}, 10.0, 3.0, 1.0) FROM {TABLE} '
+            f'WHERE {TABLE} MATCH %s '
+            f'AND rowid = {Recipe._meta.db_table}.id',
+            [query],
+            output_field=FloatField()
+        )
+    else:
+        return queryset.filter(Q(name__icontains=query)
+                               | Q(text__icontains=query))
+    return queryset.filter(id__in=matches).annotate(
+        search_rank=rank
+    ).order_by('-search_rank', '-pub_date')
@@ -0,0 +1,40 @@
+"""Поколения данных о рецептах для инвалидации кэша ответов.
+
+Каждый рецепт относится к поколению всего каталога, своего автора, своих
+тегов и своему собственному. Изменение рецепта сдвигает все эти поколения,
+поэтому закэшированная выдача по другому автору или тегу остаётся валидной.
+"""
+from . import versions
+
+ALL = 'recipes'
+
+
+def author(author_id):
+    return f'recipes:author:{author_id}'
+
+
+def tag(tag_id):
+    return f'recipes:tag:{tag_id}'
+
+
+def recipe(recipe_id):
+    return f'recipes:recipe:{recipe_id}'
+
+
+def invalidate(recipe_ids=(), author_ids=(), tag_ids=()):
+    versions.bump_versions([
+        ALL,
+        *map(recipe, set(recipe_ids)),
+        *map(author, set(author_ids)),
+        *map(tag, set(tag_ids)),
+    ])
+
+
+def invalidate_recipes(queryset):
+    """Сдвигает поколения рецептов из queryset, их авторов и тегов."""
+    rows = list(queryset.values_list('id', 'author_id', 'tags'))
+    invalidate(
+        [recipe_id for recipe_id, _, _ in rows],
+        [author_id for _, author_id, _ in rows],
+        [tag_id for _, _, tag_id in rows if tag_id is not None],
+    )
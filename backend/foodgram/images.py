@@ -0,0 +1,135 @@
+"""Фоновая подготовка копий изображений рецептов.
+
+Запрос декодирует загруженный base64 и сохраняет исходный файл, но не
+меняет его размер и не перекодирует. Уменьшенные копии делает пул
+потоков процесса после фиксации транзакции и записывает пути к ним в
+поля Recipe.image_<копия>. Пока копий нет, отдаётся исходный файл.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from . import generations
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {
+    'thumbnail': ((480, 480), 'JPEG', 'jpg'),
+    'detail': ((1280, 1280), 'JPEG', 'jpg'),
+    'webp': ((480, 480), 'WEBP', 'webp'),
+}
+RENDITION_FIELDS = [f'image_{name}' for name in RENDITIONS]
+UPLOAD_TO = 'recipe_img/renditions/'
+
+_executor = None
+_executor_lock = Lock()
+
+
+def accepts_webp(accept):
+    """Указан ли WebP в заголовке Accept клиента."""
+    return 'image/webp' in (accept or '')
+
+
+def accepted_renditions(renditions, accept):
+    """Копии в форматах, которые клиент может показать."""
+    webp = accepts_webp(accept)
+    return [
+        name for name in renditions
+        if webp or RENDITIONS[name][1] != 'WEBP'
+    ]
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-images'
+            )
+    return _executor
+
+
+def render(image, size, image_format):
+    image = image.copy()
+    image.thumbnail(size, Image.LANCZOS)
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    output = BytesIO()
+    image.save(output, image_format, quality=82, optimize=True)
+    return ContentFile(output.getvalue())
+
+
+def process_recipe_images(recipe_id):
+    """Создаёт все копии изображения рецепта и сохраняет пути к ним."""
+    recipe = Recipe.objects.only('image', *RENDITION_FIELDS).get(pk=recipe_id)
+    source_name = recipe.image.name
+    storage = recipe.image.storage
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    with recipe.image.open('rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    renditions = {}
+    for name, (size, image_format, extension) in RENDITIONS.items():
+        renditions[f'image_{name}'] = storage.save(
+            f'{UPLOAD_TO}{stem}_{name}.{extension}',
+            render(image, size, image_format)
+        )
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=source_name
+    ).update(**renditions)
+    if updated:
+        # update() не шлёт post_save: ссылки на копии в кэшах ответов и
+        # карточек обновляются сдвигом поколений рецепта.
+        generations.invalidate_recipes(Recipe.objects.filter(pk=recipe_id))
+    stale = (
+        renditions.values() if not updated
+        else [getattr(recipe, field).name for field in RENDITION_FIELDS]
+    )
+    for name in stale:
+        if name:
+            storage.delete(name)
+
+
+def _run(recipe_id):
+    try:
+        process_recipe_images(recipe_id)
+    except Recipe.DoesNotExist:
+        pass
+    except Exception:
+        logger.exception('Recipe %s image processing failed', recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule(recipe_id):
+    transaction.on_commit(lambda: get_executor().submit(_run, recipe_id))
+
+
+def reset_renditions(recipe):
+    """Сбрасывает копии перед заменой изображения; файлы удаляются
+    после фиксации транзакции. Вызывается внутри transaction.atomic.
+
+    Поля копий не входят в обычный save() рецепта (см.
+    Recipe.protected_fields), поэтому сброс — отдельный UPDATE по строке,
+    заблокированной до конца транзакции: копии, которые фоновая задача
+    успела записать после чтения рецепта, тоже будут удалены.
+    """
+    recipes = Recipe.objects.select_for_update().filter(pk=recipe.pk)
+    stale = [
+        name for name in recipes.values_list(*RENDITION_FIELDS).first() or ()
+        if name
+    ]
+    recipes.update(**{field: '' for field in RENDITION_FIELDS})
+    for field in RENDITION_FIELDS:
+        setattr(recipe, field, '')
+    storage = recipe.image.storage
+    transaction.on_commit(lambda: [storage.delete(name) for name in stale])
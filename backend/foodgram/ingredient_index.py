@@ -0,0 +1,95 @@
+"""Префиксный индекс ингредиентов для автодополнения.
+
+Каталог целиком держится в памяти процесса в виде отсортированного по
+нормализованному названию списка. Поиск идёт бинарным поиском по
+префиксу, поэтому на запросы при наборе текста база не нужна. Индекс
+перестраивается, когда меняется версия 'ingredients' в общем кэше.
+"""
+import re
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+
+from replicas.router import primary
+
+from . import versions
+from .models import Ingredient
+
+VERSION_NAME = 'ingredients'
+_spaces = re.compile(r'\s+')
+
+
+def normalize(value):
+    return _spaces.sub(' ', value.casefold().replace('ё', 'е')).strip()
+
+
+class IngredientIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        # (keys, entries) заменяются одним присваиванием: поиск в другом
+        # потоке не должен увидеть ключи нового индекса с записями старого.
+        self._data = ([], [])
+
+    def _build(self):
+        entries = sorted(
+            (
+                (normalize(name), pk),
+                {'id': pk, 'name': name, 'measurement_unit': unit},
+            )
+            for pk, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ).iterator()
+        )
+        return [key for (key, _), _ in entries], [item for _, item in entries]
+
+    def refresh(self):
+        version = versions.get_version(VERSION_NAME)
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                with primary():
+                    self._data = self._build()
+                self._version = version
+
+    def search(self, query, limit=None):
+        """Точные совпадения, затем по префиксу, затем по подстроке."""
+        query = normalize(query)
+        limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+        if not query:
+            return []
+        self.refresh()
+        keys, entries = self._data
+        exact, prefix = [], []
+        position = bisect_left(keys, query)
+        while position < len(keys) and keys[position].startswith(query):
+            if keys[position] == query:
+                exact.append(position)
+            else:
+                prefix.append(position)
+            position += 1
+        prefix.sort(key=lambda index: len(keys[index]))
+        found = exact + prefix
+        if len(found) < limit:
+            substring = [
+                index for index, key in enumerate(keys)
+                if query in key and not key.startswith(query)
+            ]
+            substring.sort(
+                key=lambda index: (keys[index].find(query), len(keys[index]))
+            )
+            found += substring
+        return [entries[index] for index in found[:limit]]
+
+
+index = IngredientIndex()
+
+
+def search(query, limit=None):
+    return index.search(query, limit)
+
+
+def invalidate():
+    versions.bump_version(VERSION_NAME)
@@ -1,7 +1,5 @@
-import csv
-
 from django.core.management.base import BaseCommand
-from foodgram.models import Ingredient
+from foodgram import bulk_load
 
 
 class Command(BaseCommand):
@@ -11,16 +9,8 @@ class Command(BaseCommand):
         parser.add_argument('file_name', type=str)
 
     def handle(self, *args, **options):
-        Ingredient.objects.all().delete()
-        file_name = options['file_name']
-        with open(file_name, 'r', encoding='utf-8') as csv_file:
-            data = csv.reader(csv_file, delimiter=',')
-            ingredients = []
-            for row in data:
-                ingredient = Ingredient(name=row[0], measurement_unit=row[1])
-                ingredients.append(ingredient)
-                if len(ingredients) > 5000:
-                    Ingredient.objects.bulk_create(ingredients)
-                    ingredients = []
-            if ingredients:
-                Ingredient.objects.bulk_create(ingredients)
+        loader = bulk_load.IngredientLoader()
+        written = bulk_load.load(loader, options['file_name'], batch_size=5000)
+        self.stdout.write(
+            self.style.SUCCESS(f'Imported {written} ingredients')
+        )
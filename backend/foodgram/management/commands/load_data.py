@@ -0,0 +1,82 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from foodgram import bulk_load
+
+
+class Command(BaseCommand):
+    help = 'Upsert ingredients, tags, users or recipes from CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('entity', choices=sorted(bulk_load.LOADERS))
+        parser.add_argument('file_name', type=str)
+        parser.add_argument('--format', choices=('csv', 'ndjson'))
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Processes for image decoding and password hashing'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Checkpoint file (default: <file_name>.checkpoint)'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore the checkpoint and load the file from the start'
+        )
+        parser.add_argument(
+            '--base-dir',
+            help='Directory for relative image paths (default: file dir)'
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def _progress(self, records, written, elapsed):
+        rate = records / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{records} records read, {written} rows written, '
+            f'{rate:.0f} records/s'
+        )
+
+    def handle(self, *args, **options):
+        file_name = options['file_name']
+        checkpoint = bulk_load.Checkpoint(
+            options['checkpoint'] or f'{file_name}.checkpoint'
+        )
+        if options['restart']:
+            checkpoint.clear()
+        executor = None
+        if options['workers'] > 1 and options['entity'] in ('users',
+                                                            'recipes'):
+            executor = ProcessPoolExecutor(
+                max_workers=options['workers'],
+                initializer=django.setup
+            )
+        loader = bulk_load.LOADERS[options['entity']](
+            executor=executor,
+            using=options['database'],
+            base_dir=options['base_dir'] or os.path.dirname(
+                os.path.abspath(file_name)
+            )
+        )
+        try:
+            written = bulk_load.load(
+                loader,
+                file_name,
+                batch_size=options['batch_size'],
+                checkpoint=checkpoint,
+                file_format=options['format'],
+                progress=self._progress
+            )
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        for error in loader.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {written} {options["entity"]}, '
+            f'{len(loader.errors)} skipped'
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from foodgram.images import process_recipe_images
+from foodgram.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Build missing (or all) recipe image renditions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Rebuild renditions that already exist too'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.order_by('id')
+        if not options['all']:
+            recipes = recipes.filter(image_thumbnail='')
+        processed = 0
+        for recipe_id in recipes.values_list('id', flat=True).iterator():
+            try:
+                process_recipe_images(recipe_id)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'Recipe {recipe_id}: {error}')
+                continue
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} recipes'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from foodgram import fulltext
+from foodgram.models import Recipe
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the recipe full-text search index'
+
+    def handle(self, *args, **options):
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        indexed = 0
+        for start in range(0, len(recipe_ids), BATCH_SIZE):
+            indexed += fulltext.reindex(recipe_ids[start:start + BATCH_SIZE])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} recipes'))
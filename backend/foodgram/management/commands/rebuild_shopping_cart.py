@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram import shopping_cart
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify materialized shopping cart totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='Limit to the given user id (can be repeated)'
+        )
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only compare stored totals with recomputed ones'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['users']
+        if options['verify']:
+            mismatches = shopping_cart.find_mismatches(user_ids)
+            for (user_id, ingredient_id), (stored, expected) in sorted(
+                mismatches.items()
+            ):
+                self.stdout.write(
+                    f'user={user_id} ingredient={ingredient_id} '
+                    f'stored={stored} expected={expected}'
+                )
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} mismatched rows')
+            self.stdout.write(
+                self.style.SUCCESS('Shopping carts are consistent')
+            )
+            return
+        rows = shopping_cart.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} rows'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from foodgram import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized favorite, cart, recipe and follower counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--field', action='append', dest='fields',
+            choices=sorted(counters.COUNTERS),
+            help='Counter to repair (can be repeated, default: all)'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def _progress(self, field, last_pk):
+        self.stdout.write(f'{field}: up to id {last_pk}')
+
+    def handle(self, *args, **options):
+        counters.repair(
+            options['fields'],
+            batch_size=options['batch_size'],
+            progress=self._progress
+        )
+        self.stdout.write(self.style.SUCCESS('Counters repaired'))
@@ -0,0 +1,72 @@
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    """
+    CREATE TABLE foodgram_recipe_search (
+        recipe_id bigint PRIMARY KEY
+            REFERENCES foodgram_recipe (id)
+            ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+        document tsvector NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX foodgram_recipe_search_document_idx
+        ON foodgram_recipe_search USING GIN (document)
+    """,
+    """
+    INSERT INTO foodgram_recipe_search (recipe_id, document)
+    SELECT recipe.id,
+           setweight(to_tsvector('russian', recipe.name), 'A')
+           || setweight(to_tsvector('russian', recipe.text), 'B')
+           || setweight(to_tsvector(
+                'russian', coalesce(string_agg(ingredient.name, ' '), '')
+              ), 'C')
+    FROM foodgram_recipe recipe
+    LEFT JOIN foodgram_recipeingredient link ON link.recipe_id = recipe.id
+    LEFT JOIN foodgram_ingredient ingredient
+        ON ingredient.id = link.ingredient_id
+    GROUP BY recipe.id
+    """,
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE foodgram_recipe_search USING fts5(
+        name, text, ingredients,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO foodgram_recipe_search (rowid, name, text, ingredients)
+    SELECT recipe.id, recipe.name, recipe.text,
+           coalesce(group_concat(ingredient.name, ' '), '')
+    FROM foodgram_recipe recipe
+    LEFT JOIN foodgram_recipeingredient link ON link.recipe_id = recipe.id
+    LEFT JOIN foodgram_ingredient ingredient
+        ON ingredient.id = link.ingredient_id
+    GROUP BY recipe.id
+    """,
+]
+
+FORWARD = {'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}
+
+
+def create_search_table(apps, schema_editor):
+    for statement in FORWARD.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in FORWARD:
+        schema_editor.execute('DROP TABLE foodgram_recipe_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0007_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.0.3 on 2026-10-18 17:09
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    using = schema_editor.connection.alias
+    Recipe = apps.get_model('foodgram', 'Recipe')
+    User = apps.get_model('users', 'User')
+    counters = (
+        (Recipe, 'favorites_count', apps.get_model('foodgram', 'Favorite'),
+         'recipe'),
+        (Recipe, 'in_carts_count', apps.get_model('foodgram', 'Purchase'),
+         'recipe'),
+        (User, 'recipes_count', Recipe, 'author'),
+        (User, 'followers_count', apps.get_model('foodgram', 'Subscription'),
+         'subscribed_to'),
+    )
+    for model, field, source, link in counters:
+        model.objects.using(using).update(**{field: Coalesce(Subquery(
+            source.objects.using(using).filter(
+                **{link: OuterRef('pk')}
+            ).order_by().values(link).annotate(
+                total=Count('pk')
+            ).values('total')
+        ), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0008_recipe_search'),
+        ('users', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в список покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
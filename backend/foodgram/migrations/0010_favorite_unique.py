@@ -0,0 +1,43 @@
+# Generated by Django 4.0.3 on 2026-10-18 17:14
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicates(apps, schema_editor):
+    using = schema_editor.connection.alias
+    Favorite = apps.get_model('foodgram', 'Favorite')
+    Recipe = apps.get_model('foodgram', 'Recipe')
+    favorites = Favorite.objects.using(using)
+    keep = favorites.values('user', 'recipe').annotate(
+        first_id=Min('id'), total=Count('id')
+    ).filter(total__gt=1).values_list('user', 'recipe', 'first_id')
+    recipe_ids = set()
+    for user_id, recipe_id, first_id in keep:
+        favorites.filter(user=user_id, recipe=recipe_id).exclude(
+            id=first_id
+        ).delete()
+        recipe_ids.add(recipe_id)
+    Recipe.objects.using(using).filter(id__in=recipe_ids).update(
+        favorites_count=Coalesce(Subquery(
+            favorites.filter(recipe=OuterRef('pk')).order_by().values(
+                'recipe'
+            ).annotate(total=Count('pk')).values('total')
+        ), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0009_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite_recipe'),
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
 
+from users.models import ProtectedFieldsMixin
+
 User = get_user_model
 
 
@@ -55,7 +57,7 @@ class Ingredient(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(ProtectedFieldsMixin, models.Model):
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -76,6 +78,21 @@ class Recipe(models.Model):
         verbose_name='Изображение',
         upload_to='recipe_img/'
     )
+    image_thumbnail = models.ImageField(
+        verbose_name='Миниатюра',
+        upload_to='recipe_img/renditions/',
+        blank=True
+    )
+    image_detail = models.ImageField(
+        verbose_name='Изображение для страницы рецепта',
+        upload_to='recipe_img/renditions/',
+        blank=True
+    )
+    image_webp = models.ImageField(
+        verbose_name='Миниатюра WebP',
+        upload_to='recipe_img/renditions/',
+        blank=True
+    )
     name = models.CharField(
         'Название',
         max_length=200,
@@ -92,9 +109,32 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'Добавлений в список покупок',
+        default=0,
+        editable=False
+    )
+
+    # Счётчики меняет foodgram.counters, копии изображения — фоновая
+    # задача foodgram.images; обычное сохранение их не перезаписывает.
+    protected_fields = (
+        'favorites_count', 'in_carts_count',
+        'image_thumbnail', 'image_detail', 'image_webp',
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            )
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -173,6 +213,12 @@ class Favorite(models.Model):
     class Meta:
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_favorite_recipe'
+            )
+        ]
 
 
 class Purchase(models.Model):
@@ -195,3 +241,30 @@ class Purchase(models.Model):
                 name='unique_purchase_recipe'
             )
         ]
+
+
+class ShoppingCartIngredient(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='cart_ingredients'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='in_carts'
+    )
+    amount = models.IntegerField('Количество', default=0)
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списке покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_cart_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} {self.amount}'
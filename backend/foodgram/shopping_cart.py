@@ -0,0 +1,159 @@
+"""Материализованные итоги списка покупок.
+
+Для каждого пользователя в ShoppingCartIngredient хранится сумма
+количеств каждого ингредиента по всем рецептам из его корзины. Таблица
+обновляется приращениями при изменении Purchase и состава рецептов,
+поэтому выгрузка списка покупок — это одно чтение по индексу.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from .models import Purchase, RecipeIngredient, ShoppingCartIngredient
+
+BATCH_SIZE = 1000
+
+
+def recipe_amounts(recipe_id):
+    return Counter(dict(
+        RecipeIngredient.objects.filter(
+            recipe=recipe_id
+        ).values_list('ingredient', 'amount')
+    ))
+
+
+def apply_delta(user_ids, delta):
+    """Прибавляет delta {ingredient_id: amount} к корзинам пользователей."""
+    delta = {
+        ingredient_id: amount
+        for ingredient_id, amount in delta.items() if amount
+    }
+    user_ids = list(user_ids)
+    if not delta or not user_ids:
+        return
+    with transaction.atomic():
+        ShoppingCartIngredient.objects.bulk_create(
+            [
+                ShoppingCartIngredient(user_id=user_id, ingredient_id=pk)
+                for user_id in user_ids
+                for pk, amount in delta.items() if amount > 0
+            ],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True
+        )
+        items = ShoppingCartIngredient.objects.filter(
+            user__in=user_ids,
+            ingredient__in=delta
+        )
+        items.update(amount=F('amount') + Case(
+            *[When(ingredient=pk, then=Value(amount))
+              for pk, amount in delta.items()],
+            output_field=IntegerField()
+        ))
+        items.filter(amount__lte=0).delete()
+
+
+def total_amounts(recipe_ids):
+    """Суммарный состав нескольких рецептов {ingredient_id: amount}."""
+    return Counter(dict(
+        RecipeIngredient.objects.filter(
+            recipe__in=recipe_ids
+        ).values_list('ingredient').annotate(total=Sum('amount')).order_by()
+    ))
+
+
+def add_recipes(user_id, recipe_ids):
+    apply_delta([user_id], total_amounts(recipe_ids))
+
+
+def remove_recipes(user_id, recipe_ids):
+    apply_delta([user_id], {
+        pk: -amount for pk, amount in total_amounts(recipe_ids).items()
+    })
+
+
+def add_recipe(user_id, recipe_id):
+    apply_delta([user_id], recipe_amounts(recipe_id))
+
+
+def remove_recipe(user_id, recipe_id):
+    apply_delta([user_id], {
+        pk: -amount for pk, amount in recipe_amounts(recipe_id).items()
+    })
+
+
+def update_recipe(recipe_id, old_amounts, new_amounts):
+    """Переносит изменение состава рецепта в корзины, где он лежит."""
+    delta = Counter(new_amounts)
+    delta.subtract(old_amounts)
+    if not any(delta.values()):
+        return
+    apply_delta(
+        Purchase.objects.filter(
+            recipe=recipe_id
+        ).values_list('user', flat=True),
+        delta
+    )
+
+
+def compute_totals(user_ids=None):
+    """Считает итоги заново по Purchase и RecipeIngredient."""
+    # Условие на покупку — одним filter(): второй вызов по многозначной
+    # связи добавил бы ещё один JOIN с Purchase и смешал корзины
+    # пользователей, у которых есть общий рецепт.
+    if user_ids is None:
+        condition = {'recipe__purchase__isnull': False}
+    else:
+        condition = {'recipe__purchase__user__in': user_ids}
+    totals = RecipeIngredient.objects.filter(**condition).values_list(
+        'recipe__purchase__user', 'ingredient'
+    ).annotate(total=Sum('amount')).order_by()
+    return {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in totals
+    }
+
+
+def stored_totals(user_ids=None):
+    queryset = ShoppingCartIngredient.objects.all()
+    if user_ids is not None:
+        queryset = queryset.filter(user__in=user_ids)
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in queryset.values_list(
+            'user', 'ingredient', 'amount'
+        )
+    }
+
+
+def find_mismatches(user_ids=None):
+    """Возвращает {(user_id, ingredient_id): (хранится, должно быть)}."""
+    expected = compute_totals(user_ids)
+    stored = stored_totals(user_ids)
+    return {
+        key: (stored.get(key), expected.get(key))
+        for key in expected.keys() | stored.keys()
+        if stored.get(key) != expected.get(key)
+    }
+
+
+def rebuild(user_ids=None):
+    totals = compute_totals(user_ids)
+    with transaction.atomic():
+        items = ShoppingCartIngredient.objects.all()
+        if user_ids is not None:
+            items = items.filter(user__in=user_ids)
+        items.delete()
+        ShoppingCartIngredient.objects.bulk_create(
+            [
+                ShoppingCartIngredient(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    amount=amount
+                )
+                for (user_id, ingredient_id), amount in totals.items()
+            ],
+            batch_size=BATCH_SIZE
+        )
+    return len(totals)
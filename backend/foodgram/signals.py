@@ -0,0 +1,136 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from . import (counters, fulltext, generations, ingredient_index,
+               shopping_cart, versions)
+from .models import (Favorite, Ingredient, Purchase, Recipe, Subscription,
+                     Tag)
+
+User = get_user_model()
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+SEARCH_FIELDS = {'name', 'text'}
+
+
+@receiver(post_save, sender=Purchase)
+def add_purchase_to_cart(sender, instance, created, **kwargs):
+    if created:
+        shopping_cart.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=Purchase)
+def remove_purchase_from_cart(sender, instance, **kwargs):
+    # pre_delete: при каскадном удалении рецепта его состав ещё на месте.
+    shopping_cart.remove_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(sender, instance, created, **kwargs):
+    if not created:
+        fulltext.reindex(
+            instance.recipes.values_list('recipe', flat=True)
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def index_saved_recipe(sender, instance, update_fields, **kwargs):
+    # После коммита: API и админка сохраняют состав рецепта уже после
+    # самого рецепта, но в той же транзакции.
+    if update_fields and not SEARCH_FIELDS & set(update_fields):
+        return
+    recipe_id = instance.id
+    transaction.on_commit(lambda: fulltext.reindex([recipe_id]))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_search(sender, instance, **kwargs):
+    fulltext.remove_recipe(instance.id)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    versions.bump_version('tags')
+
+
+COUNTED_LINKS = {
+    Favorite: ('favorites_count', 'recipe_id'),
+    Purchase: ('in_carts_count', 'recipe_id'),
+    Recipe: ('recipes_count', 'author_id'),
+    Subscription: ('followers_count', 'subscribed_to_id'),
+}
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Purchase)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscription)
+def increment_counter(sender, instance, created, **kwargs):
+    if created:
+        field, link = COUNTED_LINKS[sender]
+        counters.change(field, getattr(instance, link), 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Purchase)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscription)
+def decrement_counter(sender, instance, **kwargs):
+    field, link = COUNTED_LINKS[sender]
+    counters.change(field, getattr(instance, link), -1)
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_saved_recipe(sender, instance, **kwargs):
+    generations.invalidate(
+        [instance.id], [instance.author_id],
+        instance.tags.values_list('id', flat=True)
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def invalidate_deleted_recipe(sender, instance, **kwargs):
+    # pre_delete: после удаления связи с тегами уже не найти.
+    generations.invalidate_recipes(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        recipes = Recipe.objects.all()
+        if action == 'pre_clear':
+            recipes = recipes.filter(tags=instance)
+        else:
+            recipes = recipes.filter(pk__in=pk_set)
+        generations.invalidate_recipes(recipes)
+        generations.invalidate(tag_ids=[instance.pk])
+    elif action == 'pre_clear':
+        generations.invalidate_recipes(Recipe.objects.filter(pk=instance.pk))
+    else:
+        generations.invalidate(
+            [instance.pk], [instance.author_id], pk_set or ()
+        )
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(sender, instance, created, update_fields,
+                              **kwargs):
+    if created or update_fields and not AUTHOR_FIELDS & set(update_fields):
+        return
+    generations.invalidate(
+        author_ids=[instance.pk],
+        tag_ids=Recipe.tags.through.objects.filter(
+            recipe__author=instance
+        ).values_list('tag_id', flat=True).distinct()
+    )
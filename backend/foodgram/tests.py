@@ -0,0 +1,498 @@
+import base64
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from users.models import User
+
+from . import (bulk_load, counters, fulltext, images, ingredient_index,
+               shopping_cart, user_lists)
+from .models import (Ingredient, Purchase, Recipe, RecipeIngredient,
+                     Subscription, Tag)
+
+
+class ShoppingCartTotalsTest(TestCase):
+    """Итоги корзин двух пользователей с общим рецептом."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob = (
+            User.objects.create_user(
+                name, f'{name}@example.com', 'pass12345', 'Имя', 'Фамилия'
+            )
+            for name in ('alice', 'bob')
+        )
+        cls.flour = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        cls.sugar = Ingredient.objects.create(
+            name='сахар', measurement_unit='г'
+        )
+        cls.shared = cls.recipe('общий', {cls.flour: 200, cls.sugar: 50})
+        cls.own = cls.recipe('свой', {cls.flour: 100})
+
+    @classmethod
+    def recipe(cls, name, amounts):
+        recipe = Recipe.objects.create(
+            author=cls.alice, name=name, text='текст', cooking_time=5,
+            image='recipe_img/x.png'
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient=ingredient, amount=amount
+            )
+            for ingredient, amount in amounts.items()
+        )
+        return recipe
+
+    def setUp(self):
+        for user, recipe in (
+            (self.alice, self.shared),
+            (self.alice, self.own),
+            (self.bob, self.shared),
+        ):
+            Purchase.objects.create(user=user, recipe=recipe)
+
+    def test_compute_totals(self):
+        alice = {
+            (self.alice.id, self.flour.id): 300,
+            (self.alice.id, self.sugar.id): 50,
+        }
+        bob = {
+            (self.bob.id, self.flour.id): 200,
+            (self.bob.id, self.sugar.id): 50,
+        }
+        self.assertEqual(shopping_cart.compute_totals([self.alice.id]), alice)
+        self.assertEqual(shopping_cart.compute_totals([self.bob.id]), bob)
+        self.assertEqual(
+            shopping_cart.compute_totals([self.alice.id, self.bob.id]),
+            {**alice, **bob}
+        )
+        self.assertEqual(shopping_cart.compute_totals(), {**alice, **bob})
+
+    def test_incremental_totals_match(self):
+        self.assertEqual(shopping_cart.find_mismatches(), {})
+        self.assertEqual(shopping_cart.find_mismatches([self.alice.id]), {})
+
+    def test_rebuild_one_user(self):
+        shopping_cart.rebuild([self.bob.id])
+        self.assertEqual(shopping_cart.find_mismatches(), {})
+        self.assertEqual(
+            shopping_cart.stored_totals([self.bob.id]),
+            {
+                (self.bob.id, self.flour.id): 200,
+                (self.bob.id, self.sugar.id): 50,
+            }
+        )
+
+
+class CounterSaveTest(TestCase):
+    """Полное сохранение объекта не затирает счётчики."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = (
+            User.objects.create_user(
+                name, f'{name}@example.com', 'pass12345', 'Имя', 'Фамилия'
+            )
+            for name in ('author', 'reader')
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='рецепт', text='текст', cooking_time=5,
+            image='recipe_img/x.png'
+        )
+
+    def test_recipe_save_keeps_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        Purchase.objects.create(user=self.reader, recipe=self.recipe)
+        counters.change('favorites_count', self.recipe.pk, 3)
+        recipe.name = 'новое название'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'новое название')
+        self.assertEqual(recipe.favorites_count, 3)
+        self.assertEqual(recipe.in_carts_count, 1)
+
+    def test_user_save_keeps_counters(self):
+        author = User.objects.get(pk=self.author.pk)
+        Subscription.objects.create(
+            user=self.reader, subscribed_to=self.author
+        )
+        author.first_name = 'Другое'
+        author.save()
+        author.refresh_from_db()
+        self.assertEqual(author.first_name, 'Другое')
+        self.assertEqual(author.recipes_count, 1)
+        self.assertEqual(author.followers_count, 1)
+
+
+class UserListsTest(TestCase):
+    """Пакетное изменение корзины и избранного."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            'buyer', 'buyer@example.com', 'pass12345', 'Имя', 'Фамилия'
+        )
+        flour = Ingredient.objects.create(name='мука', measurement_unit='г')
+        cls.recipes = []
+        for number in range(3):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=f'рецепт {number}', text='текст',
+                cooking_time=5, image='recipe_img/x.png'
+            )
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=flour, amount=100
+            )
+            cls.recipes.append(recipe.id)
+
+    def assertConsistent(self):
+        self.assertEqual(shopping_cart.find_mismatches(), {})
+        for recipe in Recipe.objects.all():
+            self.assertEqual(
+                recipe.in_carts_count,
+                Purchase.objects.filter(recipe=recipe).count()
+            )
+
+    def test_add_and_remove(self):
+        first, second, third = self.recipes
+        Purchase.objects.create(user=self.user, recipe_id=first)
+        self.assertEqual(
+            user_lists.add(Purchase, self.user.id, [first, second, 0]),
+            {
+                first: user_lists.EXISTS,
+                second: user_lists.ADDED,
+                0: user_lists.NOT_FOUND,
+            }
+        )
+        self.assertConsistent()
+        self.assertEqual(
+            user_lists.remove(Purchase, self.user.id, [second, third]),
+            {second: user_lists.REMOVED, third: user_lists.ABSENT}
+        )
+        self.assertConsistent()
+
+    def test_add_counts_only_inserted_rows(self):
+        first, second, _ = self.recipes
+        split = user_lists._split
+
+        def concurrent_insert(model, user_id, recipe_ids):
+            # Другой запрос добавил рецепт после нашей проверки.
+            result = split(model, user_id, recipe_ids)
+            Purchase.objects.create(user_id=user_id, recipe_id=first)
+            return result
+
+        with mock.patch.object(user_lists, '_split', concurrent_insert):
+            results = user_lists.add(Purchase, self.user.id, [first, second])
+        self.assertEqual(
+            results, {first: user_lists.EXISTS, second: user_lists.ADDED}
+        )
+        self.assertConsistent()
+
+    def test_remove_counts_only_deleted_rows(self):
+        first, second, _ = self.recipes
+        user_lists.add(Purchase, self.user.id, [first, second])
+        split = user_lists._split
+
+        def concurrent_delete(model, user_id, recipe_ids):
+            result = split(model, user_id, recipe_ids)
+            Purchase.objects.get(user_id=user_id, recipe_id=first).delete()
+            return result
+
+        with mock.patch.object(user_lists, '_split', concurrent_delete):
+            results = user_lists.remove(
+                Purchase, self.user.id, [first, second]
+            )
+        self.assertEqual(
+            results, {first: user_lists.ABSENT, second: user_lists.REMOVED}
+        )
+        self.assertConsistent()
+
+
+class IngredientIndexTest(TestCase):
+
+    def test_search_after_rebuild(self):
+        index = ingredient_index.IngredientIndex()
+        for name, unit in (('Мука', 'г'), ('мука', 'кг'), ('сахар', 'г')):
+            Ingredient.objects.create(name=name, measurement_unit=unit)
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient_index.invalidate()
+        self.assertEqual(
+            [item['measurement_unit'] for item in index.search('мук')],
+            ['г', 'кг']
+        )
+        keys, entries = index._data
+        self.assertEqual(
+            keys, [ingredient_index.normalize(item['name'])
+                   for item in entries]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='ёлка', measurement_unit='шт')
+        self.assertEqual(index.search('ел')[0]['name'], 'ёлка')
+
+
+class RecipeRenditionsTest(TestCase):
+    """Поля копий изображения пишет только фоновая задача."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            'author', 'author@example.com', 'pass12345', 'Имя', 'Фамилия'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='рецепт', text='текст', cooking_time=5,
+            image='recipe_img/x.png'
+        )
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+    def render(self):
+        """Как process_recipe_images: файлы копий и один UPDATE."""
+        renditions = {
+            field: default_storage.save(
+                f'{images.UPLOAD_TO}{field}.jpg', ContentFile(b'jpeg')
+            )
+            for field in images.RENDITION_FIELDS
+        }
+        Recipe.objects.filter(pk=self.recipe.pk).update(**renditions)
+        return renditions
+
+    def test_edit_keeps_renditions(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        renditions = self.render()
+        recipe.text = 'новый текст'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.text, 'новый текст')
+        for field, name in renditions.items():
+            self.assertEqual(getattr(recipe, field).name, name)
+
+    def test_reset_removes_renditions_written_after_load(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        renditions = self.render()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                images.reset_renditions(recipe)
+                recipe.save()
+        recipe.refresh_from_db()
+        for field, name in renditions.items():
+            self.assertEqual(getattr(recipe, field).name, '')
+            self.assertFalse(default_storage.exists(name))
+
+
+class RecipeSearchIndexTest(TestCase):
+    """Рецепт попадает в поиск при любом способе сохранения."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            'author', 'author@example.com', 'pass12345', 'Имя', 'Фамилия'
+        )
+        cls.saffron = Ingredient.objects.create(
+            name='шафран', measurement_unit='г'
+        )
+
+    def found(self, query):
+        return list(fulltext.search(Recipe.objects.all(), query))
+
+    def test_index_after_commit_with_ingredients(self):
+        # Как в админке: сначала рецепт, потом состав из инлайна.
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                recipe = Recipe.objects.create(
+                    author=self.author, name='плов', text='текст',
+                    cooking_time=5, image='recipe_img/x.png'
+                )
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=self.saffron, amount=1
+                )
+        self.assertEqual(self.found('шафран'), [recipe])
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.name = 'ризотто'
+            recipe.save()
+        self.assertEqual(self.found('ризотто'), [recipe])
+        self.assertEqual(self.found('плов'), [])
+
+
+class RecipeAdminTest(TestCase):
+    """Правка состава в админке доходит до корзин и поиска."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'pass12345',
+            first_name='Имя', last_name='Фамилия'
+        )
+        cls.author, cls.buyer = (
+            User.objects.create_user(
+                name, f'{name}@example.com', 'pass12345', 'Имя', 'Фамилия'
+            )
+            for name in ('author', 'buyer')
+        )
+        cls.tag = Tag.objects.create(
+            name='обед', color='#000000', slug='lunch'
+        )
+        cls.flour = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        cls.sugar = Ingredient.objects.create(
+            name='сахар', measurement_unit='г'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='пирог', text='текст', cooking_time=5,
+            image='recipe_img/x.png'
+        )
+        cls.recipe.tags.set([cls.tag])
+        cls.row = RecipeIngredient.objects.create(
+            recipe=cls.recipe, ingredient=cls.flour, amount=100
+        )
+        Purchase.objects.create(user=cls.buyer, recipe=cls.recipe)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_inline_change_updates_cart_and_search(self):
+        prefix = 'ing_in_recipe'
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/admin/foodgram/recipe/{self.recipe.id}/change/', {
+                    'author': self.author.id,
+                    'tags': [self.tag.id],
+                    'name': 'пирог',
+                    'text': 'текст',
+                    'cooking_time': 5,
+                    f'{prefix}-TOTAL_FORMS': 2,
+                    f'{prefix}-INITIAL_FORMS': 1,
+                    f'{prefix}-0-id': self.row.id,
+                    f'{prefix}-0-recipe': self.recipe.id,
+                    f'{prefix}-0-ingredient': self.flour.id,
+                    f'{prefix}-0-amount': 300,
+                    f'{prefix}-1-recipe': self.recipe.id,
+                    f'{prefix}-1-ingredient': self.sugar.id,
+                    f'{prefix}-1-amount': 50,
+                }
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(shopping_cart.find_mismatches(), {})
+        self.assertEqual(
+            shopping_cart.stored_totals([self.buyer.id]),
+            {
+                (self.buyer.id, self.flour.id): 300,
+                (self.buyer.id, self.sugar.id): 50,
+            }
+        )
+        self.assertEqual(
+            list(fulltext.search(Recipe.objects.all(), 'сахар')),
+            [self.recipe]
+        )
+
+    def test_recipe_ingredient_delete_updates_cart(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/admin/foodgram/recipeingredient/{self.row.id}/delete/',
+                {'post': 'yes'}
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(shopping_cart.find_mismatches(), {})
+        self.assertEqual(shopping_cart.stored_totals([self.buyer.id]), {})
+        self.assertEqual(
+            list(fulltext.search(Recipe.objects.all(), 'мука')), []
+        )
+
+    def test_author_filter(self):
+        Recipe.objects.create(
+            author=self.buyer, name='суп', text='текст', cooking_time=5,
+            image='recipe_img/x.png'
+        )
+        response = self.client.get(
+            f'/admin/foodgram/recipe/?author={self.author.id}'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.recipe]
+        )
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertContains(response, 'select2')
+
+
+class BulkLoadImagesTest(TestCase):
+    """Файлы изображений при повторной и неудачной загрузке."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(
+            'author', 'author@example.com', 'pass12345', 'Имя', 'Фамилия'
+        )
+        Tag.objects.create(name='обед', color='#000000', slug='lunch')
+        Ingredient.objects.create(name='мука', measurement_unit='г')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media = media.name
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+    def load(self, color):
+        image = io.BytesIO()
+        Image.new('RGB', (8, 8), color).save(image, 'PNG')
+        path = os.path.join(self.media, 'recipes.ndjson')
+        with open(path, 'w', encoding='utf-8') as source:
+            json.dump({
+                'name': 'пирог', 'text': 'текст', 'cooking_time': 5,
+                'author': 'author@example.com', 'tags': ['lunch'],
+                'ingredients': [
+                    {'name': 'мука', 'measurement_unit': 'г', 'amount': 100}
+                ],
+                'image': base64.b64encode(image.getvalue()).decode(),
+            }, source)
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_load.load(bulk_load.RecipeLoader(), path)
+
+    def files(self):
+        return {
+            os.path.relpath(os.path.join(directory, name), self.media)
+            for directory, _, names in os.walk(self.media)
+            for name in names if not name.endswith('.ndjson')
+        }
+
+    def recipe_files(self):
+        recipe = Recipe.objects.get(name='пирог')
+        return {
+            getattr(recipe, field).name
+            for field in bulk_load.RecipeLoader.image_fields
+        }
+
+    def test_unchanged_image_is_not_rewritten(self):
+        self.load('red')
+        files = self.files()
+        self.assertEqual(files, self.recipe_files())
+        self.load('red')
+        self.assertEqual(self.files(), files)
+        self.load('blue')
+        self.assertEqual(self.files(), self.recipe_files())
+        self.assertFalse(self.files() & files)
+
+    def test_failed_batch_removes_new_files(self):
+        self.load('red')
+        files = self.files()
+        with mock.patch.object(
+            fulltext, 'reindex', side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            self.load('blue')
+        self.assertEqual(self.files(), files)
+        self.assertEqual(self.recipe_files(), files)
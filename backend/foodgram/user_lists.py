@@ -0,0 +1,109 @@
+"""Пакетное изменение избранного и корзины пользователя.
+
+Строки вставляются и удаляются одним INSERT ... ON CONFLICT DO NOTHING
+и одним DELETE мимо сигналов моделей, поэтому итоги списка покупок и
+счётчики рецептов обновляются здесь явно, по одному запросу на всю
+пачку, а остальным (кэшам) об изменении сообщает сигнал changed. Какие
+строки изменил именно этот запрос, база сообщает через RETURNING: при
+параллельном добавлении того же рецепта корзина не посчитается дважды.
+"""
+from django.db import connection, transaction
+from django.dispatch import Signal
+
+from . import counters, shopping_cart
+from .models import Favorite, Purchase, Recipe
+
+ADDED = 'added'
+EXISTS = 'exists'
+REMOVED = 'removed'
+ABSENT = 'absent'
+NOT_FOUND = 'not_found'
+
+# sender — Favorite или Purchase; аргументы user_id и recipe_ids.
+changed = Signal()
+
+COUNTER_FIELDS = {
+    Favorite: 'favorites_count',
+    Purchase: 'in_carts_count',
+}
+
+
+def _split(model, user_id, recipe_ids):
+    found = set(Recipe.objects.filter(
+        id__in=recipe_ids
+    ).values_list('id', flat=True))
+    present = set(model.objects.filter(
+        user=user_id, recipe__in=found
+    ).values_list('recipe_id', flat=True))
+    return found, present
+
+
+def _execute(sql, params, expected):
+    """Выполняет INSERT/DELETE; возвращает id рецептов изменённых строк.
+
+    Без RETURNING (SQLite до 3.35) остаётся ожидаемое множество: SQLite
+    не даст записать транзакции, чьё чтение устарело, так что оно точно.
+    """
+    returning = connection.features.can_return_rows_from_bulk_insert
+    if returning:
+        sql += ' RETURNING recipe_id'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        if not returning:
+            return expected
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _insert(model, user_id, recipe_ids):
+    if not recipe_ids:
+        return set()
+    return _execute(
+        f'INSERT INTO {model._meta.db_table} (user_id, recipe_id) '
+        f'VALUES {", ".join(["(%s, %s)"] * len(recipe_ids))} '
+        f'ON CONFLICT DO NOTHING',
+        [value for pk in recipe_ids for value in (user_id, pk)],
+        recipe_ids
+    )
+
+
+def _delete(model, user_id, recipe_ids):
+    if not recipe_ids:
+        return set()
+    return _execute(
+        f'DELETE FROM {model._meta.db_table} WHERE user_id = %s '
+        f'AND recipe_id IN ({", ".join(["%s"] * len(recipe_ids))})',
+        [user_id, *recipe_ids],
+        recipe_ids
+    )
+
+
+def add(model, user_id, recipe_ids):
+    """Добавляет рецепты в список; возвращает {recipe_id: статус}."""
+    with transaction.atomic():
+        found, present = _split(model, user_id, recipe_ids)
+        added = _insert(model, user_id, found - present)
+        if model is Purchase:
+            shopping_cart.add_recipes(user_id, added)
+        counters.refresh(COUNTER_FIELDS[model], added)
+        if added:
+            changed.send(model, user_id=user_id, recipe_ids=added)
+    return {
+        pk: ADDED if pk in added else EXISTS if pk in found else NOT_FOUND
+        for pk in recipe_ids
+    }
+
+
+def remove(model, user_id, recipe_ids):
+    """Убирает рецепты из списка; возвращает {recipe_id: статус}."""
+    with transaction.atomic():
+        found, present = _split(model, user_id, recipe_ids)
+        removed = _delete(model, user_id, present)
+        if model is Purchase:
+            shopping_cart.remove_recipes(user_id, removed)
+        counters.refresh(COUNTER_FIELDS[model], removed)
+        if removed:
+            changed.send(model, user_id=user_id, recipe_ids=removed)
+    return {
+        pk: REMOVED if pk in removed else ABSENT if pk in found else NOT_FOUND
+        for pk in recipe_ids
+    }
@@ -0,0 +1,68 @@
+"""Версии справочных данных в общем кэше.
+
+Версия — случайный токен, который меняется при каждом изменении данных.
+По нему процессы узнают, что их локальные копии устарели, а клиенты
+получают ETag. Чтобы изменения были видны во всех воркерах и из
+команд вроде import_csv и load_data, в CACHES должен быть общий бэкенд:
+по умолчанию это Redis из infra/docker-compose.yml.
+"""
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = 'version:'
+
+
+def _new_token():
+    return uuid4().hex[:16]
+
+
+def get_version(name):
+    key = KEY_PREFIX + name
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_token(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    """Меняет версию после фиксации текущей транзакции."""
+    transaction.on_commit(
+        lambda: cache.set(KEY_PREFIX + name, _new_token(), None)
+    )
+
+
+def get_versions(names):
+    """Версии сразу нескольких наборов данных одним запросом к кэшу."""
+    keys = {KEY_PREFIX + name: name for name in names}
+    found = cache.get_many(list(keys))
+    result = {keys[key]: version for key, version in found.items()}
+    for name in names:
+        if name not in result:
+            result[name] = get_version(name)
+    return result
+
+
+def get_many_with_versions(keys, names):
+    """Значения keys из кэша и версии names за один get_many."""
+    version_keys = {KEY_PREFIX + name: name for name in names}
+    found = cache.get_many([*keys, *version_keys])
+    result = {
+        version_keys[key]: found.pop(key)
+        for key in list(found) if key in version_keys
+    }
+    for name in names:
+        if name not in result:
+            result[name] = get_version(name)
+    return found, result
+
+
+def bump_versions(names):
+    """Меняет версии нескольких наборов данных после фиксации транзакции."""
+    names = list(names)
+    if names:
+        transaction.on_commit(lambda: cache.set_many(
+            {KEY_PREFIX + name: _new_token() for name in names}, None
+        ))
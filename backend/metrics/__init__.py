@@ -0,0 +1,6 @@
+"""Метрики запросов: время SQL, сериализации и рендеринга, размер ответа.
+
+MetricsMiddleware собирает их для каждого запроса, отдаёт заголовком
+Server-Timing и копит гистограммы по представлениям; /metrics выводит их
+в текстовом формате Prometheus.
+"""
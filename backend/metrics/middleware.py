@@ -0,0 +1,110 @@
+import asyncio
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .registry import registry
+from .state import RequestMetrics, current, sql_wrapper
+
+
+@receiver(connection_created, dispatch_uid='metrics_sql_wrapper')
+def install_sql_wrapper(connection, **kwargs):
+    """Ставит sql_wrapper на соединение один раз; вне запроса он пуст."""
+    if sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_wrapper)
+
+
+def view_name(view_func, method):
+    """RecipeViewSet.list, RecipeViewSet.download_shopping_cart, …"""
+    cls = getattr(view_func, 'cls', None) or getattr(
+        view_func, 'view_class', None
+    )
+    if cls is None:
+        return getattr(view_func, '__name__', 'unknown')
+    method = method.lower()
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{cls.__name__}.{actions.get(method, method)}'
+
+
+class MetricsMiddleware:
+    """Собирает метрики запроса и добавляет заголовок Server-Timing.
+
+    Заголовок получают сотрудники (is_staff) или все, если включён
+    METRICS_SERVER_TIMING. Для потоковых ответов размер тела и работа
+    после отдачи заголовков не учитываются. Работает и в синхронной, и в
+    асинхронной цепочке; запросы к базе из потоков sync_to_async тоже
+    считаются, потому что обёртка стоит на каждом соединении.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        for connection in connections.all():
+            install_sql_wrapper(connection=connection)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        start = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self._finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        start = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self._finish(request, response, metrics, start)
+
+    def _finish(self, request, response, metrics, start):
+        duration = perf_counter() - start
+        size = None if response.streaming else len(response.content)
+        registry.observe(
+            getattr(request, 'metrics_view', 'unresolved'), duration,
+            metrics.queries, metrics.sql_time, metrics.serializer_time,
+            metrics.render_time, size
+        )
+        if self._show_timing(request):
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={metrics.sql_time * 1000:.1f};'
+                f'desc="{metrics.queries} queries"',
+                f'serializer;dur={metrics.serializer_time * 1000:.1f}',
+                f'render;dur={metrics.render_time * 1000:.1f}',
+                f'total;dur={duration * 1000:.1f}',
+            ))
+        return response
+
+    @staticmethod
+    def _show_timing(request):
+        if settings.METRICS_SERVER_TIMING:
+            return True
+        user = getattr(request, 'user', None)
+        return bool(user is not None and user.is_staff)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_name(view_func, request.method)
+
+    def process_template_response(self, request, response):
+        metrics = current.get()
+        start = perf_counter()
+
+        def rendered(response):
+            metrics.render_time += perf_counter() - start
+
+        if metrics is not None:
+            response.add_post_render_callback(rendered)
+        return response
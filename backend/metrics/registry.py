@@ -0,0 +1,216 @@
+"""Гистограммы по представлениям и их сведение между процессами.
+
+Каждый процесс копит метрики в памяти. Если задан METRICS_DIR, процесс
+не чаще раза в METRICS_FLUSH_INTERVAL секунд сохраняет свой снимок в
+файл <pid>.json, а /metrics суммирует файлы всех воркеров gunicorn.
+Файлы завершившихся воркеров остаются, чтобы счётчики не убывали;
+каталог очищается при перезапуске сервиса.
+
+Кроме представлений, реестр копит метрики пулов соединений dbpool по
+алиасам баз; загрузка пула — rate(busy_seconds_total) к его размеру.
+"""
+import json
+import os
+import tempfile
+from bisect import bisect_left
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+HISTOGRAMS = (
+    ('duration', 'foodgram_request_duration_seconds',
+     'Request latency', DURATION_BUCKETS),
+    ('queries', 'foodgram_request_queries',
+     'SQL queries per request', QUERY_BUCKETS),
+)
+TOTALS = (
+    ('sql_seconds', 'foodgram_request_sql_seconds_total',
+     'Time spent in SQL'),
+    ('serializer_seconds', 'foodgram_request_serializer_seconds_total',
+     'Time spent building serializer data'),
+    ('render_seconds', 'foodgram_request_render_seconds_total',
+     'Time spent rendering responses'),
+    ('response_bytes', 'foodgram_response_bytes_total',
+     'Size of non-streaming response bodies'),
+)
+
+
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+POOL_HISTOGRAMS = (
+    ('wait', 'foodgram_db_pool_wait_seconds',
+     'Time spent waiting for a pooled DB connection', POOL_WAIT_BUCKETS),
+)
+POOL_TOTALS = (
+    ('busy_seconds', 'foodgram_db_pool_busy_seconds_total',
+     'Time pooled DB connections spent checked out'),
+    ('timeouts', 'foodgram_db_pool_timeouts_total',
+     'Checkouts that gave up waiting for a DB connection'),
+    ('opened', 'foodgram_db_pool_opened_total', 'DB connections opened'),
+    ('closed', 'foodgram_db_pool_closed_total', 'DB connections closed'),
+)
+
+# Раздел снимка: (имя метки, гистограммы, счётчики)
+FAMILIES = {
+    'views': ('view', HISTOGRAMS, TOTALS),
+    'pools': ('alias', POOL_HISTOGRAMS, POOL_TOTALS),
+}
+
+
+def _empty(histograms, totals):
+    data = {name: 0 for name, *_ in totals}
+    for name, _, _, buckets in histograms:
+        data[name] = {
+            'buckets': [0] * (len(buckets) + 1), 'sum': 0, 'count': 0
+        }
+    return data
+
+
+def _observe(histogram, buckets, value):
+    histogram['buckets'][bisect_left(buckets, value)] += 1
+    histogram['sum'] += value
+    histogram['count'] += 1
+
+
+def merge(snapshots):
+    result = {family: {} for family in FAMILIES}
+    for snapshot in snapshots:
+        for family, (_, histograms, totals) in FAMILIES.items():
+            for key, data in snapshot.get(family, {}).items():
+                target = result[family].setdefault(
+                    key, _empty(histograms, totals)
+                )
+                for name, *_ in totals:
+                    target[name] += data[name]
+                for name, *_ in histograms:
+                    for field in ('sum', 'count'):
+                        target[name][field] += data[name][field]
+                    target[name]['buckets'] = [
+                        a + b for a, b in zip(
+                            target[name]['buckets'], data[name]['buckets']
+                        )
+                    ]
+    return result
+
+
+def _label(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n'
+    )
+
+
+def _render_family(items, label_name, histograms, totals):
+    lines = []
+    for name, metric, help_text, buckets in histograms:
+        lines += [f'# HELP {metric} {help_text}',
+                  f'# TYPE {metric} histogram']
+        for key in sorted(items):
+            histogram = items[key][name]
+            label = f'{label_name}="{_label(key)}"'
+            cumulative = 0
+            for bound, count in zip(
+                (*buckets, '+Inf'), histogram['buckets']
+            ):
+                cumulative += count
+                lines.append(
+                    f'{metric}_bucket{{{label},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{metric}_sum{{{label}}} {histogram["sum"]}')
+            lines.append(f'{metric}_count{{{label}}} {histogram["count"]}')
+    for name, metric, help_text in totals:
+        lines += [f'# HELP {metric} {help_text}',
+                  f'# TYPE {metric} counter']
+        for key in sorted(items):
+            lines.append(
+                f'{metric}{{{label_name}="{_label(key)}"}} {items[key][name]}'
+            )
+    return lines
+
+
+def render(snapshot):
+    """Текстовый формат Prometheus 0.0.4."""
+    lines = []
+    for family, (label_name, histograms, totals) in FAMILIES.items():
+        lines += _render_family(
+            snapshot.get(family, {}), label_name, histograms, totals
+        )
+    return '\n'.join(lines) + '\n'
+
+
+class Registry:
+
+    def __init__(self):
+        self._views = {}
+        self._pools = {}
+        self._lock = Lock()
+        self._flushed_at = 0.0
+
+    def observe(self, view, duration, queries, sql_time, serializer_time,
+                render_time, size):
+        with self._lock:
+            data = self._views.setdefault(
+                view, _empty(HISTOGRAMS, TOTALS)
+            )
+            _observe(data['duration'], DURATION_BUCKETS, duration)
+            _observe(data['queries'], QUERY_BUCKETS, queries)
+            data['sql_seconds'] += sql_time
+            data['serializer_seconds'] += serializer_time
+            data['render_seconds'] += render_time
+            data['response_bytes'] += size or 0
+        if monotonic() - self._flushed_at > settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def observe_pool(self, alias, wait=None, **totals):
+        """Ожидание соединения (wait) и приращения счётчиков POOL_TOTALS."""
+        with self._lock:
+            data = self._pools.setdefault(
+                alias, _empty(POOL_HISTOGRAMS, POOL_TOTALS)
+            )
+            if wait is not None:
+                _observe(data['wait'], POOL_WAIT_BUCKETS, wait)
+            for name, value in totals.items():
+                data[name] += value
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(
+                {'views': self._views, 'pools': self._pools}
+            ))
+
+    def flush(self):
+        """Сохраняет снимок процесса в METRICS_DIR, если он задан."""
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+        self._flushed_at = monotonic()
+        os.makedirs(directory, exist_ok=True)
+        descriptor, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(path, os.path.join(directory, f'{os.getpid()}.json'))
+
+    def collect(self):
+        """Сводный снимок всех процессов (или только текущего)."""
+        directory = settings.METRICS_DIR
+        if not directory:
+            return self.snapshot()
+        self.flush()
+        snapshots = []
+        for name in os.listdir(directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, name)) as file:
+                    snapshots.append(json.load(file))
+            except (OSError, ValueError):
+                continue
+        return merge(snapshots)
+
+
+registry = Registry()
@@ -0,0 +1,16 @@
+from rest_framework import serializers
+
+from .state import serializer_timer
+
+
+class TimedDataMixin:
+    """Засекает время построения .data сериализатора."""
+
+    @property
+    def data(self):
+        with serializer_timer():
+            return super().data
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
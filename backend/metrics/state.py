@@ -0,0 +1,44 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Счётчики одного запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.render_time = 0.0
+        self._serializer_depth = 0
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    """execute_wrapper: считает запросы и их время."""
+    metrics = current.get()
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if metrics is not None:
+            metrics.queries += 1
+            metrics.sql_time += perf_counter() - start
+
+
+@contextmanager
+def serializer_timer():
+    """Время сериализации; вложенные сериализаторы не учитываются дважды."""
+    metrics = current.get()
+    if metrics is None or metrics._serializer_depth:
+        yield
+        return
+    metrics._serializer_depth += 1
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        metrics._serializer_depth -= 1
+        metrics.serializer_time += perf_counter() - start
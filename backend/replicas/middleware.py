@@ -0,0 +1,75 @@
+import asyncio
+
+from django.conf import settings
+
+from .router import RequestRouting, current
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+COOKIE_SALT = 'replicas.sticky'
+
+
+def is_sticky(request):
+    """Писал ли клиент недавно: подписанная cookie моложе тайм-аута."""
+    return request.get_signed_cookie(
+        settings.REPLICA_STICKY_COOKIE, default=None, salt=COOKIE_SALT,
+        max_age=settings.REPLICA_STICKY_TIMEOUT
+    ) is not None
+
+
+class StickyMiddleware:
+    """Read-your-writes: после записи клиент читает основную базу.
+
+    Запросы на запись целиком идут в основную базу. Если запрос писал,
+    ответ ставит подписанную cookie REPLICA_STICKY_COOKIE на
+    REPLICA_STICKY_TIMEOUT секунд, и следующие запросы клиента тоже
+    читают основную базу, пока реплики догоняют. Метка хранится у
+    клиента, поэтому не зависит от кэша и от того, какой воркер примет
+    следующий запрос.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        routing = self._routing(request)
+        token = current.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self._remember(request, routing, response)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+        routing = self._routing(request)
+        token = current.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self._remember(request, routing, response)
+
+    @staticmethod
+    def _routing(request):
+        return RequestRouting(
+            request.method not in READ_METHODS or is_sticky(request)
+        )
+
+    @staticmethod
+    def _remember(request, routing, response):
+        if routing.wrote or request.method not in READ_METHODS:
+            response.set_signed_cookie(
+                settings.REPLICA_STICKY_COOKIE, '1', salt=COOKIE_SALT,
+                max_age=settings.REPLICA_STICKY_TIMEOUT,
+                secure=request.is_secure(), httponly=True, samesite='Lax'
+            )
+        return response
@@ -0,0 +1,79 @@
+"""Чтение с реплик, запись в основную базу.
+
+Состояние запроса хранится в contextvar, который ставит StickyMiddleware;
+оно видно и в потоках sync_to_async. Вне запроса (команды, фоновые
+потоки) всё идёт в основную базу. Основную читают запросы на запись,
+клиенты, которые писали недавно (REPLICA_STICKY_TIMEOUT), транзакции и
+код внутри primary() — им пользуются кэши, чтобы не закэшировать
+отставшие данные реплики под новой версией.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+current = ContextVar('replica_routing', default=None)
+
+# Сессии и токены только что созданы при входе и ещё могут не доехать
+PRIMARY_APP_LABELS = ('sessions', 'authtoken')
+
+
+class RequestRouting:
+    def __init__(self, use_primary=False):
+        self.use_primary = use_primary
+        self.wrote = False
+        self._replica = None
+
+    @property
+    def replica(self):
+        if self._replica is None:
+            self._replica = random.choice(settings.DATABASE_REPLICAS)
+        return self._replica
+
+
+@contextmanager
+def primary():
+    """Читать основную базу внутри блока."""
+    routing = current.get()
+    if routing is None:
+        yield
+        return
+    previous, routing.use_primary = routing.use_primary, True
+    try:
+        yield
+    finally:
+        routing.use_primary = previous
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        routing = current.get()
+        if (
+            routing is None
+            or routing.use_primary
+            or not settings.DATABASE_REPLICAS
+            or model._meta.app_label in PRIMARY_APP_LABELS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = current.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
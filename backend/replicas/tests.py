@@ -0,0 +1,176 @@
+import os
+import tempfile
+from http.cookies import SimpleCookie
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from foodgram.models import Favorite, Recipe
+from users.models import User
+
+from .middleware import StickyMiddleware
+from .router import PrimaryReplicaRouter, primary
+
+REPLICA = 'replica_1'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], REPLICA_STICKY_TIMEOUT=10)
+class ReplicaRoutingTest(SimpleTestCase):
+    """Куда StickyMiddleware и роутер отправляют чтение.
+
+    Алиас реплики не открывается: достаточно того, какую базу выбирает
+    QuerySet.db.
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.cookies = {}
+
+    def request(self, method='get', token=None, write=False):
+        """Выполняет запрос и возвращает базы для чтения внутри него."""
+        seen = {}
+
+        def view(request):
+            seen['recipes'] = Recipe.objects.all().db
+            seen['tokens'] = Token.objects.all().db
+            with primary():
+                seen['primary'] = Recipe.objects.all().db
+            if write:
+                PrimaryReplicaRouter().db_for_write(Recipe)
+            return HttpResponse()
+
+        # У каждого клиента свои cookie, как у браузера.
+        self.factory.cookies = self.cookies.setdefault(token, SimpleCookie())
+        headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        response = StickyMiddleware(view)(
+            getattr(self.factory, method)('/api/recipes/', **headers)
+        )
+        self.factory.cookies.update(response.cookies)
+        return seen
+
+    def test_outside_request_reads_primary(self):
+        self.assertEqual(Recipe.objects.all().db, 'default')
+
+    def test_read_request_uses_replica(self):
+        seen = self.request(token='reader')
+        self.assertEqual(seen['recipes'], REPLICA)
+        self.assertEqual(seen['tokens'], 'default')
+        self.assertEqual(seen['primary'], 'default')
+
+    def test_write_request_reads_primary_and_sticks(self):
+        self.assertEqual(
+            self.request('post', token='writer')['recipes'], 'default'
+        )
+        self.assertEqual(self.request(token='writer')['recipes'], 'default')
+        self.assertEqual(self.request(token='other')['recipes'], REPLICA)
+        self.assertEqual(self.request()['recipes'], REPLICA)
+
+    def test_write_during_read_request_sticks(self):
+        self.assertEqual(
+            self.request(token='writer', write=True)['recipes'], REPLICA
+        )
+        self.assertEqual(self.request(token='writer')['recipes'], 'default')
+
+    def test_sticky_client_expires(self):
+        self.request('post', token='writer')
+        with mock.patch('django.core.signing.time.time') as now:
+            now.return_value = 10 ** 10
+            self.assertEqual(
+                self.request(token='writer')['recipes'], REPLICA
+            )
+
+    def test_forged_mark_is_ignored(self):
+        self.cookies['writer'] = SimpleCookie({'replica_sticky': '1'})
+        self.assertEqual(self.request(token='writer')['recipes'], REPLICA)
+
+    def test_async_request(self):
+        seen = {}
+
+        async def view(request):
+            seen['recipes'] = Recipe.objects.all().db
+            return HttpResponse()
+
+        middleware = StickyMiddleware(view)
+        async_to_sync(middleware)(self.factory.get('/api/recipes/'))
+        self.assertEqual(seen['recipes'], REPLICA)
+
+    def test_replica_is_not_migrated(self):
+        router = PrimaryReplicaRouter()
+        self.assertIs(router.allow_migrate(REPLICA, 'foodgram'), False)
+        self.assertIsNone(router.allow_migrate('default', 'foodgram'))
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], REPLICA_STICKY_TIMEOUT=10)
+class ReadAfterWriteTest(TransactionTestCase):
+    """Две базы SQLite: реплика — снимок основной, сделанный до записи.
+
+    Запись, которую реплика ещё не получила, видна тому же клиенту в
+    следующем запросе и не видна клиенту без метки.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Алиас появляется после проверок раннера тестов: реплику он не
+        # создаёт и не очищает, её содержимое задаёт replicate().
+        replica = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False)
+        replica.close()
+        cls.replica_path = replica.name
+        connections.settings[REPLICA] = {
+            **connections.settings['default'], 'NAME': cls.replica_path
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        os.remove(cls.replica_path)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            'reader', 'reader@example.com', 'pass12345', 'Имя', 'Фамилия'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='рецепт', text='текст', cooking_time=5,
+            image='recipe_img/x.png'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.replicate()
+
+    def replicate(self):
+        for alias in ('default', REPLICA):
+            connections[alias].ensure_connection()
+        connections['default'].connection.backup(
+            connections[REPLICA].connection
+        )
+
+    def client_for(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        return client
+
+    def favorites(self, client):
+        cache.clear()
+        response = client.get('/api/recipes/?is_favorited=1')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_writer_reads_own_write(self):
+        writer = self.client_for()
+        writer.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertTrue(Favorite.objects.filter(user=self.user).exists())
+        self.assertEqual(self.favorites(writer), [self.recipe.id])
+        # Тот же токен без cookie — другой клиент: читает отставшую реплику.
+        self.assertEqual(self.favorites(self.client_for()), [])
+        self.replicate()
+        self.assertEqual(self.favorites(self.client_for()), [self.recipe.id])
@@ -1,10 +1,16 @@
 from django.contrib import admin
 
+from foodgram.admin_utils import LargeTableAdmin
+
 from .models import User
 
 
-class UserAdmin(admin.ModelAdmin):
-    list_filter = ('email', 'username',)
+class UserAdmin(LargeTableAdmin):
+    list_display = ('username', 'email', 'recipes_count', 'followers_count')
+    list_filter = ('is_active', 'is_staff')
+    search_fields = ('^username', '^email')
+    readonly_fields = ('recipes_count', 'followers_count')
+    ordering = ('id',)
 
 
 admin.site.register(User, UserAdmin)
@@ -0,0 +1,80 @@
+"""Аутентификация по токену без запроса к базе на каждый запрос.
+
+Пользователь по токену ищется сначала в LRU процесса, затем в общем кэше
+и только потом в базе. Запись действительна, пока не сменилась версия
+пользователя в foodgram.versions: её сдвигают выход (удаление токена),
+сохранение, которое меняет поля пользователя (пароль, активность,
+профиль; не last_login при входе), и его удаление.
+Сверка версии — одно чтение из общего кэша, поэтому сброс сразу виден
+во всех процессах, если кэш действительно общий (Redis, Memcached).
+LocMemCache у каждого процесса свой: там сброс в одном воркере другим
+не виден, и записи живут не дольше TOKEN_AUTH_LOCAL_CACHE_TIMEOUT —
+столько отозванный токен может ещё приниматься соседними воркерами.
+Записи LRU процесса ограничены тем же сроком при любом кэше.
+"""
+import copy
+from hashlib import sha256
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.authentication import TokenAuthentication
+
+from api.caching import PayloadCache
+from foodgram import versions
+
+local_cache = PayloadCache(max_size=settings.TOKEN_AUTH_LOCAL_CACHE_SIZE)
+
+
+def _version_name(user_id):
+    return f'auth:{user_id}'
+
+
+def _cache_key(key):
+    return 'auth:token:' + sha256(key.encode()).hexdigest()
+
+
+def _shared_timeout():
+    if isinstance(caches['default'], LocMemCache):
+        return settings.TOKEN_AUTH_LOCAL_CACHE_TIMEOUT
+    return settings.TOKEN_AUTH_CACHE_TIMEOUT
+
+
+def _get_local(cache_key):
+    item = local_cache.get(cache_key)
+    if item is None or item[1] < monotonic():
+        return None
+    return item[0]
+
+
+def _set_local(cache_key, entry):
+    local_cache.set(
+        cache_key,
+        (entry, monotonic() + settings.TOKEN_AUTH_LOCAL_CACHE_TIMEOUT)
+    )
+
+
+def invalidate_user(user_id):
+    """Сбрасывает закэшированные токены пользователя после коммита."""
+    versions.bump_version(_version_name(user_id))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        cache_key = _cache_key(key)
+        entry = local_cache_entry = _get_local(cache_key)
+        if entry is None:
+            entry = cache.get(cache_key)
+        if entry is not None:
+            user, token, version = entry
+            if versions.get_version(_version_name(user.id)) == version:
+                if local_cache_entry is None:
+                    _set_local(cache_key, entry)
+                return copy.copy(user), token
+        user, token = super().authenticate_credentials(key)
+        entry = (user, token, versions.get_version(_version_name(user.id)))
+        _set_local(cache_key, entry)
+        cache.set(cache_key, entry, _shared_timeout())
+        return copy.copy(user), token
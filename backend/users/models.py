@@ -33,7 +33,29 @@ class UserManager(BaseUserManager):
         return user
 
 
-class User(AbstractBaseUser):
+class ProtectedFieldsMixin:
+    """Не даёт полному save() существующего объекта затереть поля,
+    которые меняются в обход него — например, счётчики из UPDATE ...
+    SET x = x + n в foodgram.counters. Явные update_fields не трогаются.
+    """
+    protected_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and not args
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+        ):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.protected_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(ProtectedFieldsMixin, AbstractBaseUser):
     username = models.CharField(
         'Логин',
         max_length=150,
@@ -55,9 +77,21 @@ class User(AbstractBaseUser):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     is_admin = models.BooleanField(default=False)
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков',
+        default=0,
+        editable=False
+    )
 
     objects = UserManager()
 
+    protected_fields = ('recipes_count', 'followers_count')
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
@@ -2,7 +2,8 @@ from django.contrib.auth import get_user_model
 from djoser.serializers import (UserCreateSerializer, UserSerializer,
                                 serializers)
 
-from foodgram.models import Subscription
+from api.membership import get_membership
+from metrics.serializers import TimedDataMixin, TimedListSerializer
 
 User = get_user_model()
 
@@ -16,7 +17,7 @@ class UserCreateSerializer(UserCreateSerializer):
         )
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(TimedDataMixin, UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -25,11 +26,9 @@ class CustomUserSerializer(UserSerializer):
             'email', 'id',
             'username', 'first_name', 'last_name', 'is_subscribed'
         )
+        list_serializer_class = TimedListSerializer
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return Subscription.objects.filter(
-            user=user, subscribed_to=obj
-        ).exists()
+        return get_membership(
+            self.context.get('request')
+        ).is_subscribed(obj.id)
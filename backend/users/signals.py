@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_user
+
+User = get_user_model()
+# Вход обновляет last_login, счётчики меняет foodgram.counters: ради них
+# закэшированные токены не сбрасываются.
+VOLATILE_FIELDS = {'last_login', *User.protected_fields}
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(pre_save, sender=User)
+def check_cached_fields(sender, instance, update_fields, using, **kwargs):
+    """Помечает сохранение, которое меняет поля закэшированного user."""
+    fields = [
+        field.attname for field in User._meta.concrete_fields
+        if not field.primary_key
+        and field.name not in VOLATILE_FIELDS
+        and (update_fields is None or field.name in update_fields)
+    ]
+    instance._changes_cached_user = False
+    if instance._state.adding or not fields:
+        return
+    stored = User.objects.using(using).filter(
+        pk=instance.pk
+    ).values_list(*fields).first()
+    instance._changes_cached_user = stored != tuple(
+        getattr(instance, field) for field in fields
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_changed_user(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_changes_cached_user', True):
+        invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
@@ -0,0 +1,88 @@
+from unittest import mock
+
+from django.contrib.auth.models import update_last_login
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import authentication
+from .authentication import CachedTokenAuthentication
+from .models import User
+
+
+@override_settings(
+    TOKEN_AUTH_CACHE_TIMEOUT=300, TOKEN_AUTH_LOCAL_CACHE_TIMEOUT=10
+)
+class CachedTokenAuthenticationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            'reader', 'reader@example.com', 'pass12345', 'Имя', 'Фамилия'
+        )
+
+    def setUp(self):
+        cache.clear()
+        authentication.local_cache._items.clear()
+        self.token = Token.objects.create(user=self.user)
+        self.key = self.token.key
+        self.backend = CachedTokenAuthentication()
+
+    def authenticate(self):
+        return self.backend.authenticate_credentials(self.key)[0]
+
+    def test_cached_after_first_request(self):
+        self.assertEqual(self.authenticate().id, self.user.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate().id, self.user.id)
+
+    def test_logout_revokes_cached_token(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_local_entries_expire(self):
+        with mock.patch.object(authentication, 'monotonic', return_value=0):
+            self.authenticate()
+        # Как в другом воркере: версия пользователя сброшена без ведома
+        # этого процесса, в кэше процесса осталась старая запись.
+        Token.objects.filter(pk=self.token.pk).delete()
+        with mock.patch.object(authentication, 'monotonic', return_value=5):
+            self.assertEqual(self.authenticate().id, self.user.id)
+        cache.clear()
+        with mock.patch.object(authentication, 'monotonic', return_value=11):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate()
+
+    def test_process_local_cache_uses_short_timeout(self):
+        with mock.patch.object(cache, 'set') as cache_set:
+            self.authenticate()
+        self.assertEqual(cache_set.call_args.args[2], 10)
+
+    def test_login_keeps_cached_token(self):
+        self.authenticate()
+        user = User.objects.get(pk=self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            update_last_login(None, user)
+            user.save()
+        with self.assertNumQueries(0):
+            self.authenticate()
+
+    def test_password_change_drops_cached_token(self):
+        self.authenticate()
+        user = User.objects.get(pk=self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.set_password('new-pass12345')
+            user.save()
+        with self.assertNumQueries(1):
+            self.assertTrue(self.authenticate().check_password(
+                'new-pass12345'
+            ))
+        user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save(update_fields=['is_active'])
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()